@@ -1,41 +1,82 @@
 import os
-import yaml
 import datetime
 import argparse
 import time
 import asyncio
 import threading
+from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
-from src import hf_scraper, utils, llm_agent, zotero_ops, paper_analyzer
+# PDF 渲染进程池以 spawn 方式启动，子进程会把本文件重新导入为 __mp_main__：
+# 导入阶段只做轻量初始化，API 客户端、响应缓存（SQLite 打开与过期淘汰）、线程池都在首次使用或 main_async 中创建
+from src import hf_scraper, utils, llm_agent, zotero_ops, paper_analyzer, cache
+from src.config import config
 from rich.console import Console
-from rich.live import Live
-from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn, TimeElapsedColumn
-from rich.panel import Panel
-from rich import box
 
 console = Console()
 
 # 全局变量
 ZOTERO_STRUCTURE = {}
+# 由 ZOTERO_STRUCTURE 生成一次的筛选 Prompt 公共部分，所有筛选请求共用
+ZOTERO_STRUCTURE_PROMPT = ""
+
+# 断点记录文件名（位于当日目录下）；每处理完一篇论文追加一行，中断后重跑时跳过已完成的论文
+CHECKPOINT_FILENAME = "progress.jsonl"
+
+def load_checkpoint(path, skip_deep=False):
+    """
+    读取断点记录，返回 {arxiv_id: 处理结果}；末尾写了一半的行直接忽略
+    --skip-deep-analysis 运行记下的感兴趣论文没有深度分析，完整运行时不复用、重新处理
+    """
+    done = {}
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = utils.json_loads(line)
+                except ValueError:
+                    continue
+                result = record['result']
+                if result.get('status') == 'interested' and record.get('skip_deep') and not skip_deep:
+                    continue
+                done[record['id']] = result
+    except OSError:
+        pass
+    return done
+
+async def classify_batch_async(batch, semaphores):
+    """批量筛选一组论文，一次 LLM 调用返回每篇论文的分析结果"""
+    filter_sem = semaphores[0]
+    loop = asyncio.get_running_loop()
+    async with filter_sem:
+        return await loop.run_in_executor(
+            None,
+            llm_agent.analyze_papers_batch,
+            [meta for _, meta in batch], ZOTERO_STRUCTURE_PROMPT
+        )
 
-async def process_paper_async(arxiv_id, meta, local_dir, target_date, skip_deep, progress, task_id, semaphores):
-    """异步处理单篇论文的流水线"""
-    filter_sem, download_sem, ocr_sem, llm_sem = semaphores
+async def process_paper_async(arxiv_id, meta, analysis, local_dir, target_date, skip_deep, progress, task_id, semaphores, http_client):
+    """异步处理单篇论文的流水线（筛选结果由 classify_batch_async 批量给出）"""
+    filter_sem, download_sem, ocr_sem, llm_sem, backlog_sem = semaphores
+    loop = asyncio.get_running_loop()
+    backlog_held = False
+    # 进度条 / 日志中使用的截断标题，只计算一次
+    title_short = meta['title'][:30]
+    title_log = meta['title'][:40]
     
     try:
-        # 1. RAG 分析 (筛选)
-        progress.update(task_id, description=f"[cyan]🔍 筛选中: {meta['title'][:30]}...")
-        async with filter_sem:
-            loop = asyncio.get_event_loop()
-            analysis = await loop.run_in_executor(
-                None, 
-                llm_agent.analyze_paper_with_structure,
-                meta['title'], meta['summary'], ZOTERO_STRUCTURE
-            )
-        
+        # 1. 筛选结果
+        if analysis.get('failed'):
+            # 筛选请求最终失败：不算「不感兴趣」，不写断点，下次运行重新筛选
+            progress.update(task_id, description=f"[red]❌ 筛选失败: {title_short}", completed=100)
+            return {
+                "status": "failed",
+                "title": meta['title'],
+                "reason": "筛选请求失败",
+                "url": meta['pdf_url']
+            }
         if not analysis.get('interested'):
-            progress.update(task_id, description=f"[grey50]⏭️  已跳过: {meta['title'][:30]}", completed=100)
+            progress.update(task_id, description=f"[grey50]⏭️  已跳过: {title_short}", completed=100)
             return {
                 "status": "ignored",
                 "title": meta['title'],
@@ -46,25 +87,29 @@ async def process_paper_async(arxiv_id, meta, local_dir, target_date, skip_deep,
         # 2. 准备目录
         category = analysis.get('category', 'Uncategorized')
         category_dir = os.path.join(local_dir, category)
-        os.makedirs(category_dir, exist_ok=True)
         
         short_title = utils.sanitize_filename(meta['title'])[:40]
         first_author = utils.sanitize_filename(meta['authors'][0])
         paper_subdir_name = f"{first_author}_{short_title}"
         paper_dir = os.path.join(category_dir, paper_subdir_name)
-        os.makedirs(paper_dir, exist_ok=True)
+        # makedirs 会一并创建分类目录，无需单独创建
+        utils.ensure_dir(paper_dir)
         
         filename = f"{first_author}_{short_title}.pdf"
         pdf_path = os.path.join(paper_dir, filename)
 
         # 3. 下载 PDF
-        progress.update(task_id, description=f"[blue]📥 下载中: {meta['title'][:30]}...", advance=20)
+        # 需要 OCR 时先占一个积压名额：已下载未 OCR 的论文数有上限，PDF 字节不会在内存中无限堆积
+        if not skip_deep:
+            await backlog_sem.acquire()
+            backlog_held = True
+        progress.update(task_id, description=f"[blue]📥 下载中: {title_short}...", advance=20)
         async with download_sem:
-            download_success = await loop.run_in_executor(None, utils.download_pdf, arxiv_id, pdf_path)
+            pdf_bytes = await utils.download_pdf_async(http_client, arxiv_id, pdf_path)
 
-        if not download_success:
-            print(f"   ❌ PDF下载失败: {meta['title'][:40]}...")
-            progress.update(task_id, description=f"[red]❌ 下载失败: {meta['title'][:30]}", completed=100)
+        if pdf_bytes is None:
+            print(f"   ❌ PDF下载失败: {title_log}...")
+            progress.update(task_id, description=f"[red]❌ 下载失败: {title_short}", completed=100)
             return {
                 "status": "failed",
                 "title": meta['title'],
@@ -83,7 +128,7 @@ async def process_paper_async(arxiv_id, meta, local_dir, target_date, skip_deep,
             }
 
             # 4.1 OCR阶段 - 独立信号量，带重试机制
-            progress.update(task_id, description=f"[magenta]📄 OCR识别: {meta['title'][:30]}...", advance=15)
+            progress.update(task_id, description=f"[magenta]📄 OCR识别: {title_short}...", advance=15)
             ocr_result = None
             max_ocr_retries = 2
 
@@ -92,24 +137,29 @@ async def process_paper_async(arxiv_id, meta, local_dir, target_date, skip_deep,
                     ocr_result = await loop.run_in_executor(
                         None,
                         paper_analyzer.extract_ocr_only,
-                        pdf_path, paper_info, category_dir
+                        pdf_path, paper_info, category_dir, pdf_bytes
                     )
 
                 if ocr_result is not None:
                     if ocr_attempt > 0:
-                        print(f"   ✅ OCR成功 (第{ocr_attempt + 1}次尝试): {meta['title'][:40]}...")
+                        print(f"   ✅ OCR成功 (第{ocr_attempt + 1}次尝试): {title_log}...")
                     break
                 else:
-                    print(f"   ⚠️  OCR失败 (尝试 {ocr_attempt + 1}/{max_ocr_retries}): {meta['title'][:40]}...")
+                    print(f"   ⚠️  OCR失败 (尝试 {ocr_attempt + 1}/{max_ocr_retries}): {title_log}...")
                     if ocr_attempt < max_ocr_retries - 1:
                         await asyncio.sleep(2 * (ocr_attempt + 1))  # 递增延迟
 
+            # OCR 结束即释放积压名额和 PDF 字节，让后续论文开始下载
+            pdf_bytes = None
+            backlog_sem.release()
+            backlog_held = False
+
             if ocr_result is None:
-                print(f"   ❌ OCR阶段最终失败，跳过LLM分析: {meta['title'][:40]}...")
+                print(f"   ❌ OCR阶段最终失败，跳过LLM分析: {title_log}...")
                 deep_analysis_result = None
             else:
                 # 4.2 LLM分析阶段 - 独立信号量，带重试机制
-                progress.update(task_id, description=f"[magenta]🧠 LLM分析: {meta['title'][:30]}...", advance=15)
+                progress.update(task_id, description=f"[magenta]🧠 LLM分析: {title_short}...", advance=15)
                 deep_analysis_result = None
                 max_llm_retries = 2
 
@@ -123,31 +173,36 @@ async def process_paper_async(arxiv_id, meta, local_dir, target_date, skip_deep,
 
                     if deep_analysis_result is not None:
                         if llm_attempt > 0:
-                            print(f"   ✅ LLM分析成功 (第{llm_attempt + 1}次尝试): {meta['title'][:40]}...")
+                            print(f"   ✅ LLM分析成功 (第{llm_attempt + 1}次尝试): {title_log}...")
                         break
                     else:
-                        print(f"   ⚠️  LLM分析失败 (尝试 {llm_attempt + 1}/{max_llm_retries}): {meta['title'][:40]}...")
+                        print(f"   ⚠️  LLM分析失败 (尝试 {llm_attempt + 1}/{max_llm_retries}): {title_log}...")
                         if llm_attempt < max_llm_retries - 1:
                             await asyncio.sleep(2 * (llm_attempt + 1))
         
         # 5. 上传 Zotero & 笔记
-        progress.update(task_id, description=f"[green]📤 上传中: {meta['title'][:30]}...", advance=30)
+        progress.update(task_id, description=f"[green]📤 上传中: {title_short}...", advance=30)
         tags = analysis.get('tags', [])
         tags.append(f"Date:{target_date}")
         
-        note_content = ""
-        if deep_analysis_result and deep_analysis_result.get('note_path'):
+        # 深度分析直接返回笔记内容，通常无需再读文件；空白笔记视为缺失
+        note_content = deep_analysis_result.get('note_content', '') if deep_analysis_result else ""
+        if not note_content.strip() and deep_analysis_result and deep_analysis_result.get('note_path'):
             try:
                 with open(deep_analysis_result['note_path'], 'r', encoding='utf-8') as f:
                     note_content = f.read()
-            except: pass
+            except OSError as e:
+                print(f"   ⚠️  读取笔记失败: {deep_analysis_result['note_path']}, 错误: {e}")
+                note_content = ""
         
-        if not note_content:
-            note_content = await loop.run_in_executor(
-                None,
-                llm_agent.generate_reading_note,
-                meta['title'], ", ".join(meta['authors']), meta['summary'], analysis
-            )
+        if not note_content.strip():
+            # 兜底笔记也是 LLM 调用，与深度分析共用 LLM 信号量，避免突发并发触发限流
+            async with llm_sem:
+                note_content = await loop.run_in_executor(
+                    None,
+                    llm_agent.generate_reading_note,
+                    meta['title'], ", ".join(meta['authors']), meta['summary'], analysis
+                )
         
         await loop.run_in_executor(
             None,
@@ -155,7 +210,7 @@ async def process_paper_async(arxiv_id, meta, local_dir, target_date, skip_deep,
             meta, pdf_path, note_content, tags, category
         )
         
-        progress.update(task_id, description=f"[bold green]✅ 已完成: {meta['title'][:30]}", completed=100)
+        progress.update(task_id, description=f"[bold green]✅ 已完成: {title_short}", completed=100)
         return {
             "status": "interested",
             "title": meta['title'],
@@ -170,37 +225,48 @@ async def process_paper_async(arxiv_id, meta, local_dir, target_date, skip_deep,
 
     except Exception as e:
         error_msg = str(e)
-        progress.update(task_id, description=f"[red]❌ 失败: {meta['title'][:30]}")
+        progress.update(task_id, description=f"[red]❌ 失败: {title_short}")
         print(f"\n❌ 论文处理失败: {meta['title']}")
         print(f"   错误信息: {error_msg}")
         import traceback
         print(f"   堆栈跟踪:\n{traceback.format_exc()}")
         return None
+    finally:
+        if backlog_held:
+            backlog_sem.release()
 
-def generate_daily_report(interested, ignored, date, local_dir):
-    """生成汇总式日报 - 基于LLM的分批次汇总"""
+def generate_daily_report(interested, ignored, date, local_dir, reuse=True):
+    """生成汇总式日报 - 基于LLM的分批次汇总（reuse=False 时不复用已有日报）"""
     print("\n📝 正在生成汇总日报...")
     os.makedirs(local_dir, exist_ok=True)
 
     if not interested:
-        md = [f"# AI 科研情报 - {date}", "", "今日无感兴趣论文。"]
         report_path = os.path.join(local_dir, "00_Daily_Report_CN.md")
         with open(report_path, 'w', encoding='utf-8') as f:
-            f.write("\n".join(md))
+            f.write(f"# AI 科研情报 - {date}\n\n今日无感兴趣论文。\n")
         print(f"✅ 日报生成完毕: {report_path}")
         return
 
+    report_path = os.path.join(local_dir, "00_Daily_Report_CN.md")
+
     # 1. 收集所有论文的note内容
     print(f"   📚 正在读取 {len(interested)} 篇论文的详细笔记...")
     papers_notes = []
     for item in interested:
         if not item:
             continue
-        note_path = item.get('deep_analysis', {}).get('note_path', '') if item.get('deep_analysis') else ''
-        if note_path and os.path.exists(note_path):
+        deep = item.get('deep_analysis') or {}
+        note_path = deep.get('note_path', '')
+        note_content = deep.get('note_content', '')
+        if not note_content and note_path:
+            # 笔记通常已在内存中；只有缺失时才读盘（直接 open，不先 exists 探测）
             try:
                 with open(note_path, 'r', encoding='utf-8') as f:
                     note_content = f.read()
+            except OSError:
+                note_content = ''
+        if note_content:
+            try:
                 # 解析note内容
                 parsed = llm_agent.parse_note_content(note_content)
                 parsed['category'] = item.get('category', 'Uncategorized')
@@ -212,8 +278,7 @@ def generate_daily_report(interested, ignored, date, local_dir):
                 continue
         else:
             # 如果没有详细笔记，使用基础信息
-            deep = item.get('deep_analysis', {})
-            analysis = deep.get('analysis', {}) if deep else {}
+            analysis = deep.get('analysis', {})
             papers_notes.append({
                 'title': item.get('title', ''),
                 'title_cn': analysis.get('title_cn', ''),
@@ -225,7 +290,8 @@ def generate_daily_report(interested, ignored, date, local_dir):
                 'key_results': analysis.get('key_results', ''),
                 'pros': analysis.get('pros', []),
                 'url': item.get('url', ''),
-                'note_path': note_path
+                # 笔记文件不存在，日报中不生成笔记链接
+                'note_path': ''
             })
 
     if not papers_notes:
@@ -234,149 +300,193 @@ def generate_daily_report(interested, ignored, date, local_dir):
 
     print(f"   ✅ 成功读取 {len(papers_notes)} 篇论文笔记")
 
+    # 笔记内容未变化时（同一日期重复运行）直接复用已有日报，跳过全部 LLM 汇总
+    # 哈希覆盖实际送入汇总的笔记内容：笔记后来补齐或深度分析结果变化时都会重新生成
+    payload_hash = cache.make_key(
+        utils.json_dumps(papers_notes),
+        sorted(item.get('title', '') for item in ignored if item)
+    )[:16]
+    hash_marker = f"<!--hash:{payload_hash}-->"
+    if reuse:
+        try:
+            with open(report_path, 'r', encoding='utf-8') as f:
+                if f.readline().strip() == hash_marker:
+                    print(f"✅ 论文笔记未变化，沿用已有日报: {report_path}")
+                    return
+        except OSError:
+            pass
+
     # 2. 分批次进行小汇总（每10篇一批）
     batch_size = 10
     batches = [papers_notes[i:i+batch_size] for i in range(0, len(papers_notes), batch_size)]
     print(f"   🔄 分为 {len(batches)} 个批次进行汇总...")
 
-    batch_summaries = []
-    for batch_idx, batch in enumerate(batches):
-        print(f"      📦 批次 {batch_idx + 1}/{len(batches)}: {len(batch)} 篇论文")
-        summary = llm_agent.summarize_papers_batch(batch, batch_idx)
-        batch_summaries.append(summary)
-
-    # 3. 基于小汇总生成最终日报
-    print(f"   🧠 正在生成最终日报...")
-    final_report = llm_agent.generate_final_daily_report(batch_summaries, len(papers_notes), date)
-
-    # 4. 构建Markdown日报
-    md = [f"# AI 科研情报 - {date}", ""]
-
-    # 4.1 今日概览
-    md.append("## 1. 今日概览")
-    md.append(final_report.get('daily_overview', '今日概览生成失败'))
-    md.append("")
-
-    # 4.2 核心洞察
-    key_insights = final_report.get('key_insights', [])
-    if key_insights:
-        md.append("## 2. 核心洞察")
-        md.append("")
-        for idx, insight in enumerate(key_insights, 1):
-            md.append(f"{idx}. {insight}")
-        md.append("")
-
-    # 4.3 方向小结
-    direction_summary = final_report.get('direction_summary', {})
-    if direction_summary:
-        md.append("## 3. 方向小结")
-        md.append("")
-        for direction, summary in direction_summary.items():
-            if summary:
-                md.append(f"### {direction}")
-                md.append(summary)
-                md.append("")
-
-    # 4.4 各批次详细汇总
-    md.append("## 4. 论文详细汇总")
-    md.append("")
-
-    for batch_idx, (batch, summary) in enumerate(zip(batches, batch_summaries), 1):
-        md.append(f"### 4.{batch_idx} 批次 {batch_idx} ({len(batch)} 篇)")
-        md.append("")
-
-        # 批次整体趋势
-        batch_summary_text = summary.get('batch_summary', '')
-        if batch_summary_text:
-            md.append(f"**整体趋势**: {batch_summary_text}")
-            md.append("")
-
-        # 技术趋势
-        tech_trends = summary.get('technical_trends', [])
-        if tech_trends:
-            md.append(f"**技术趋势**: {', '.join(tech_trends)}")
-            md.append("")
-
-        # 每篇论文要点
-        papers_highlights = summary.get('papers_highlights', [])
-        md.append("**论文要点**:")
-        md.append("")
-
-        for paper_idx, (paper, highlight) in enumerate(zip(batch, papers_highlights), 1):
-            md.append(f"{paper_idx}. **{paper.get('title', '')}**")
-            if paper.get('title_cn'):
-                md.append(f"   - 中文标题: {paper['title_cn']}")
-
-            # 使用LLM提取的要点
-            if highlight:
-                md.append(f"   - 方法: {highlight.get('key_method', '')}")
-                md.append(f"   - 发现: {highlight.get('key_finding', '')}")
-                if highlight.get('result_highlight'):
-                    md.append(f"   - 结果: {highlight.get('result_highlight')}")
-            else:
-                # 备用：使用解析的内容
-                if paper.get('method_summary'):
-                    method = paper['method_summary'][:100] + "..." if len(paper['method_summary']) > 100 else paper['method_summary']
-                    md.append(f"   - 方法: {method}")
-
-            # 链接
-            if paper.get('note_path') and os.path.exists(paper['note_path']):
-                rel_note = os.path.relpath(paper['note_path'], local_dir)
-                md.append(f"   - 📄 [详细笔记]({rel_note}) | 🔗 [arXiv原文]({paper['url']})")
-
-            md.append("")
-
-        md.append("---")
-        md.append("")
-
-    # 4.5 值得关注论文
-    notable_papers = final_report.get('notable_papers', [])
-    if notable_papers:
-        md.append("## 5. 值得关注论文")
-        md.append("")
-        for idx, paper in enumerate(notable_papers, 1):
-            md.append(f"{idx}. **{paper.get('title', '')}**")
-            md.append(f"   - {paper.get('why_notable', '')}")
-            md.append("")
-
-    # 4.6 未来趋势
-    future_trends = final_report.get('future_trends', '')
-    if future_trends:
-        md.append("## 6. 未来趋势展望")
-        md.append(future_trends)
-        md.append("")
-
-    # 4.7 忽略的论文
-    if ignored:
-        md.append(f"## 7. 其他论文 ({len(ignored)} 篇)")
-        md.append("")
-        md.append("以下论文因不符合当前研究方向被过滤：")
-        md.append("")
-        md.append("| 序号 | 标题 | 过滤原因 |")
-        md.append("|:---:|:---|:---|")
-        for idx, item in enumerate(ignored[:15], 1):
-            short_title = item['title'][:55] + "..." if len(item['title']) > 55 else item['title']
-            reason = item.get('reason', '未知原因')
-            if len(reason) > 50:
-                reason = reason[:50] + "..."
-            md.append(f"| {idx} | [{short_title}]({item['url']}) | {reason} |")
-        md.append("")
-
-    # 5. 保存日报
-    report_path = os.path.join(local_dir, "00_Daily_Report_CN.md")
-    with open(report_path, 'w', encoding='utf-8') as f:
-        f.write("\n".join(md))
+    if len(batches) == 1:
+        # 只有一个批次：批次汇总与最终日报合并为一次调用
+        print(f"   🧠 正在生成日报（单批次合并汇总）...")
+        summary, final_report = llm_agent.generate_report_bundle(batches[0], date)
+        batch_summaries = [summary]
+    else:
+        # 各批次互不依赖，按 LLM 并发上限并行汇总（map 保持批次顺序）
+        for batch_idx, batch in enumerate(batches):
+            print(f"      📦 批次 {batch_idx + 1}/{len(batches)}: {len(batch)} 篇论文")
+        llm_workers = config.get('concurrency', {}).get('llm_workers', 4)
+        with ThreadPoolExecutor(max_workers=max(1, min(len(batches), llm_workers))) as pool:
+            batch_summaries = list(pool.map(llm_agent.summarize_papers_batch, batches, range(len(batches))))
+
+        # 3. 基于小汇总生成最终日报
+        print(f"   🧠 正在生成最终日报...")
+        final_report = llm_agent.generate_final_daily_report(batch_summaries, len(papers_notes), date)
+
+    # 任一批次汇总或最终日报退回了失败占位内容时不写哈希标记，下次运行会重新生成
+    degraded = final_report.get('failed') or any(summary.get('failed') for summary in batch_summaries)
+    if degraded:
+        print("   ⚠️  部分汇总生成失败，本次日报不会被后续运行复用")
+
+    # 4. 边构建边写入Markdown日报（带缓冲的流式写入，不在内存中累积整份报告）
+    base_dir = Path(local_dir)
+
+    def rel_link(path):
+        """笔记相对日报的路径（笔记都在 local_dir 下，直接截取前缀；统一用 / 分隔）"""
+        try:
+            return Path(path).relative_to(base_dir).as_posix()
+        except ValueError:
+            return Path(os.path.relpath(path, local_dir)).as_posix()
+
+    # 先写临时文件再原子替换：中途失败不会留下带哈希标记的残缺日报
+    tmp_report_path = report_path + ".tmp"
+    with open(tmp_report_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+        def w(line=""):
+            f.write(line)
+            f.write("\n")
+
+        if not degraded:
+            w(hash_marker)
+        w(f"# AI 科研情报 - {date}")
+        w()
+
+        # 4.1 今日概览
+        w("## 1. 今日概览")
+        w(final_report.get('daily_overview', '今日概览生成失败'))
+        w("")
+
+        # 4.2 核心洞察
+        key_insights = final_report.get('key_insights', [])
+        if key_insights:
+            w("## 2. 核心洞察")
+            w("")
+            for idx, insight in enumerate(key_insights, 1):
+                w(f"{idx}. {insight}")
+            w("")
+
+        # 4.3 方向小结
+        direction_summary = final_report.get('direction_summary', {})
+        if direction_summary:
+            w("## 3. 方向小结")
+            w("")
+            for direction, summary in direction_summary.items():
+                if summary:
+                    w(f"### {direction}")
+                    w(summary)
+                    w("")
+
+        # 4.4 各批次详细汇总
+        w("## 4. 论文详细汇总")
+        w("")
+
+        for batch_idx, (batch, summary) in enumerate(zip(batches, batch_summaries), 1):
+            w(f"### 4.{batch_idx} 批次 {batch_idx} ({len(batch)} 篇)")
+            w("")
+
+            # 批次整体趋势
+            batch_summary_text = summary.get('batch_summary', '')
+            if batch_summary_text:
+                w(f"**整体趋势**: {batch_summary_text}")
+                w("")
+
+            # 技术趋势
+            tech_trends = summary.get('technical_trends', [])
+            if tech_trends:
+                w(f"**技术趋势**: {', '.join(tech_trends)}")
+                w("")
+
+            # 每篇论文要点
+            papers_highlights = summary.get('papers_highlights', [])
+            w("**论文要点**:")
+            w("")
+
+            for paper_idx, (paper, highlight) in enumerate(zip(batch, papers_highlights), 1):
+                w(f"{paper_idx}. **{paper.get('title', '')}**")
+                if paper.get('title_cn'):
+                    w(f"   - 中文标题: {paper['title_cn']}")
+
+                # 使用LLM提取的要点
+                if highlight:
+                    w(f"   - 方法: {highlight.get('key_method', '')}")
+                    w(f"   - 发现: {highlight.get('key_finding', '')}")
+                    if highlight.get('result_highlight'):
+                        w(f"   - 结果: {highlight.get('result_highlight')}")
+                else:
+                    # 备用：使用解析的内容
+                    if paper.get('method_summary'):
+                        method = paper['method_summary'][:100] + "..." if len(paper['method_summary']) > 100 else paper['method_summary']
+                        w(f"   - 方法: {method}")
+
+                # 链接
+                # 收集阶段已确认笔记存在，这里无需再 stat
+                if paper.get('note_path'):
+                    rel_note = rel_link(paper['note_path'])
+                    w(f"   - 📄 [详细笔记]({rel_note}) | 🔗 [arXiv原文]({paper['url']})")
+
+                w("")
+
+            w("---")
+            w("")
+
+        # 4.5 值得关注论文
+        notable_papers = final_report.get('notable_papers', [])
+        if notable_papers:
+            w("## 5. 值得关注论文")
+            w("")
+            for idx, paper in enumerate(notable_papers, 1):
+                w(f"{idx}. **{paper.get('title', '')}**")
+                w(f"   - {paper.get('why_notable', '')}")
+                w("")
+
+        # 4.6 未来趋势
+        future_trends = final_report.get('future_trends', '')
+        if future_trends:
+            w("## 6. 未来趋势展望")
+            w(future_trends)
+            w("")
+
+        # 4.7 忽略的论文
+        if ignored:
+            w(f"## 7. 其他论文 ({len(ignored)} 篇)")
+            w("")
+            w("以下论文因不符合当前研究方向被过滤：")
+            w("")
+            w("| 序号 | 标题 | 过滤原因 |")
+            w("|:---:|:---|:---|")
+            for idx, item in enumerate(ignored[:15], 1):
+                short_title = item['title'][:55] + "..." if len(item['title']) > 55 else item['title']
+                reason = item.get('reason', '未知原因')
+                if len(reason) > 50:
+                    reason = reason[:50] + "..."
+                w(f"| {idx} | [{short_title}]({item['url']}) | {reason} |")
+            w("")
+
+    os.replace(tmp_report_path, report_path)
     print(f"✅ 日报生成完毕: {report_path}")
 
 async def main_async():
     parser = argparse.ArgumentParser()
     parser.add_argument('--date', type=str, help='YYYY-MM-DD', default=None)
     parser.add_argument('--skip-deep-analysis', action='store_true', help='跳过深度分析')
+    parser.add_argument('--refresh-zotero', action='store_true', help='忽略本地缓存，重新扫描 Zotero 目录结构')
+    parser.add_argument('--no-resume', action='store_true', help='忽略断点记录与已有日报，重新处理当日全部论文')
     args = parser.parse_args()
 
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-
     target_date = args.date if args.date else datetime.datetime.now().strftime('%Y-%m-%d')
     base_dir = config['local_storage']['base_dir']
     local_dir = os.path.join(base_dir, target_date)
@@ -384,81 +494,152 @@ async def main_async():
     concurrency_config = config.get('concurrency', {})
     # 增加并发度 - 各阶段独立控制
     filter_limit = concurrency_config.get('paper_workers', 4)
-    download_limit = 10  # 下载可以更多
+    filter_batch_size = concurrency_config.get('filter_batch_size', 8)  # 每次筛选请求包含的论文数
+    download_limit = concurrency_config.get('pdf_workers', 10)  # 下载可以更多
     ocr_limit = concurrency_config.get('ocr_workers', 4)  # OCR并发
     llm_limit = concurrency_config.get('llm_workers', 4)  # LLM分析并发
 
     print(f"📅 日期: {target_date} | 本地目录: {local_dir}")
     print(f"⚙️  并发配置: 筛选={filter_limit}, 下载={download_limit}, OCR={ocr_limit}, LLM={llm_limit}")
 
-    global ZOTERO_STRUCTURE
-    ZOTERO_STRUCTURE = zotero_ops.get_existing_structure()
+    global ZOTERO_STRUCTURE, ZOTERO_STRUCTURE_PROMPT
+    ZOTERO_STRUCTURE = zotero_ops.get_existing_structure_cached(refresh=args.refresh_zotero)
+    ZOTERO_STRUCTURE_PROMPT = llm_agent.format_structure_prompt(ZOTERO_STRUCTURE)
 
     arxiv_ids = hf_scraper.get_daily_papers(target_date)
     if not arxiv_ids:
         print("今天没有新论文。")
         return
 
-    print(f"🔍 抓取到 {len(arxiv_ids)} 篇，开始异步流水线处理...")
+    # 断点续跑：已完成（筛选跳过或处理成功）的论文直接复用记录的结果，失败（含筛选失败）的论文会重新处理
+    utils.ensure_dir(local_dir)
+    checkpoint_path = os.path.join(local_dir, CHECKPOINT_FILENAME)
+    done = {} if args.no_resume else load_checkpoint(checkpoint_path, args.skip_deep_analysis)
+    done = {aid: done[aid] for aid in arxiv_ids if aid in done}
+    if done:
+        print(f"♻️  断点记录中已有 {len(done)} 篇完成，跳过")
+        arxiv_ids = [aid for aid in arxiv_ids if aid not in done]
+
+    print(f"🔍 抓取到 {len(arxiv_ids) + len(done)} 篇，开始异步流水线处理...")
+
+    # 专用线程池：默认 executor 上限为 min(32, cpu+4)，低核机器上会压住各阶段的信号量并发
+    # 筛选/OCR/LLM 各占满额，Zotero 上传与笔记兜底按下载并发预留，另加少量余量
+    # asyncio.run 结束时会自动 shutdown 默认 executor
+    max_workers = filter_limit + ocr_limit + llm_limit + download_limit + 8
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="paper")
+    )
 
-    # 信号量控制 - 4个独立信号量
+    # 信号量控制 - 4个阶段信号量 + 下载到 OCR 之间的积压上限
     semaphores = (
         asyncio.Semaphore(filter_limit),   # 0: 筛选
         asyncio.Semaphore(download_limit), # 1: 下载
         asyncio.Semaphore(ocr_limit),      # 2: OCR
-        asyncio.Semaphore(llm_limit)       # 3: LLM分析
+        asyncio.Semaphore(llm_limit),      # 3: LLM分析
+        asyncio.Semaphore(download_limit + 2 * ocr_limit)  # 4: 已下载/下载中但未完成 OCR 的论文数
     )
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),
-        TimeElapsedColumn(),
-        console=console,
-        expand=True
-    ) as progress:
+    # 共享异步 HTTP 客户端：所有 PDF 下载复用同一连接池
+    # 客户端与断点文件都由上下文管理器关闭：异常或 Ctrl-C 中断时断点记录同样落盘
+    async with utils.create_async_http_client(max_connections=max(download_limit, 16)) as http_client:
+        with open(checkpoint_path, 'w' if args.no_resume else 'a', encoding='utf-8') as checkpoint_file, Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TaskProgressColumn(),
+            TimeElapsedColumn(),
+            console=console,
+            expand=True,
+            # 每篇论文一行，任务多时整表重绘开销明显；降低刷新频率即可
+            refresh_per_second=4
+        ) as progress:
         
-        # 预先创建所有任务占位
-        tasks_map = {}
-        for aid in arxiv_ids:
-            tid = progress.add_task(f"[grey50]等待中: {aid}", total=100)
-            tasks_map[aid] = tid
+            # 预先创建所有任务占位
+            tasks_map = {}
+            for aid in arxiv_ids:
+                tid = progress.add_task(f"[grey50]等待中: {aid}", total=100)
+                tasks_map[aid] = tid
             
-        # 流式获取元数据并启动处理
-        async_tasks = []
-        meta_queue = asyncio.Queue()
+            # 流式获取元数据并启动处理
+            async_tasks = []
+            # 有界队列 + 待筛选批次上限：筛选跟不上时，元数据抓取线程阻塞等待，而不是无限堆积
+            meta_queue = asyncio.Queue(maxsize=filter_limit * filter_batch_size * 2)
+            batch_slots = asyncio.Semaphore(filter_limit * 2)
         
-        def fetch_meta():
-            try:
-                for aid, meta in utils.get_arxiv_metadata_stream(arxiv_ids):
-                    asyncio.run_coroutine_threadsafe(meta_queue.put((aid, meta)), loop)
-            finally:
-                # 放入结束标记
-                asyncio.run_coroutine_threadsafe(meta_queue.put((None, None)), loop)
+            def fetch_meta():
+                try:
+                    for aid, meta in utils.get_arxiv_metadata_stream(
+                        arxiv_ids,
+                        chunk_size=concurrency_config.get('arxiv_chunk_size', 50),
+                        delay=concurrency_config.get('arxiv_delay', 3)
+                    ):
+                        # 等待放入完成（队列满时在此阻塞）
+                        asyncio.run_coroutine_threadsafe(meta_queue.put((aid, meta)), loop).result()
+                finally:
+                    # 放入结束标记
+                    asyncio.run_coroutine_threadsafe(meta_queue.put((None, None)), loop)
         
-        loop = asyncio.get_running_loop()
-        threading.Thread(target=fetch_meta, daemon=True).start()
-        
-        while True:
-            aid, meta = await meta_queue.get()
-            if aid is None: break
-            
-            tid = tasks_map[aid]
-            t = asyncio.create_task(process_paper_async(
-                aid, meta, local_dir, target_date, args.skip_deep_analysis, progress, tid, semaphores
-            ))
-            async_tasks.append(t)
-            
-        if async_tasks:
-            results = await asyncio.gather(*async_tasks)
-        else:
-            results = []
+            loop = asyncio.get_running_loop()
+            threading.Thread(target=fetch_meta, daemon=True).start()
         
+            async def run_batch(batch):
+                """先批量筛选，再把每篇论文送入后续流水线"""
+                try:
+                    for aid, meta in batch:
+                        progress.update(tasks_map[aid], description=f"[cyan]🔍 筛选中: {meta['title'][:30]}...")
+                    analyses = await classify_batch_async(batch, semaphores)
+                finally:
+                    # 筛选完成即归还名额，下载/OCR 等后续阶段不占用
+                    batch_slots.release()
+                return await asyncio.gather(*(
+                    run_paper(aid, meta, analysis)
+                    for (aid, meta), analysis in zip(batch, analyses)
+                ), return_exceptions=True)
+
+            async def run_paper(aid, meta, analysis):
+                """处理单篇论文，完成后立即写入断点记录"""
+                result = await process_paper_async(
+                    aid, meta, analysis, local_dir, target_date, args.skip_deep_analysis,
+                    progress, tasks_map[aid], semaphores, http_client
+                )
+                if result and result.get('status') in ('interested', 'ignored'):
+                    # 记下运行模式：跳过深度分析时记录的感兴趣论文，之后完整运行会重新处理
+                    record = {"id": aid, "result": result, "skip_deep": args.skip_deep_analysis}
+                    checkpoint_file.write(utils.json_dumps(record) + "\n")
+                    # 每条记录写完即刷新：进程崩溃时最多丢失正在写的一行
+                    checkpoint_file.flush()
+                return result
+
+            finished = False
+            while not finished:
+                # 取出当前已到达的元数据（最多 filter_batch_size 篇）组成一个筛选批次
+                batch = []
+                aid, meta = await meta_queue.get()
+                while aid is not None:
+                    batch.append((aid, meta))
+                    if len(batch) >= filter_batch_size or meta_queue.empty():
+                        break
+                    aid, meta = meta_queue.get_nowait()
+                finished = aid is None
+
+                if batch:
+                    await batch_slots.acquire()
+                    async_tasks.append(asyncio.create_task(run_batch(batch)))
+
+            # 按完成顺序收集结果：先完成的批次立即归档，不必等最慢的一批
+            results = list(done.values())
+            for finished_batch in asyncio.as_completed(async_tasks):
+                try:
+                    batch_results = await finished_batch
+                except Exception as e:
+                    console.print(f"[red]⚠️ 批次处理失败: {e}")
+                    continue
+                results.extend(r for r in batch_results if r and not isinstance(r, BaseException))
+
     interested = [r for r in results if r and r.get('status') == 'interested']
     ignored = [r for r in results if r and r.get('status') == 'ignored']
     
-    generate_daily_report(interested, ignored, target_date, local_dir)
+    generate_daily_report(interested, ignored, target_date, local_dir, reuse=not args.no_resume)
 
 if __name__ == "__main__":
     asyncio.run(main_async())
@@ -0,0 +1,76 @@
+"""
+通过 OpenAI Batch API 预先完成当日论文筛选（价格约为在线调用的一半，不受 RPM/TPM 限制）
+用法:
+    python scripts/batch_filter.py submit [--date YYYY-MM-DD]   # 前一晚提交
+    python scripts/batch_filter.py collect [--date YYYY-MM-DD]  # 任务完成后取回，结果写入筛选缓存
+
+取回后正常运行 main.py，筛选阶段直接命中缓存；任务未按时完成时 main.py 照常走在线调用
+注意: 需要启用 cache，且 Batch API 只使用 openai 默认端点
+"""
+import os
+import sys
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import hf_scraper, utils, llm_agent, zotero_ops
+from src.config import config
+
+
+def _state_path(date):
+    cache_dir = config.get('cache', {}).get('dir', '.cache')
+    utils.ensure_dir(cache_dir)
+    return os.path.join(cache_dir, f"batch_filter_{date}.json")
+
+
+def submit(date):
+    arxiv_ids = hf_scraper.get_daily_papers(date)
+    if not arxiv_ids:
+        print("今天没有新论文。")
+        return
+    concurrency_config = config.get('concurrency', {})
+    metadata = utils.get_arxiv_metadata(
+        arxiv_ids,
+        chunk_size=concurrency_config.get('arxiv_chunk_size', 50),
+        delay=concurrency_config.get('arxiv_delay', 3)
+    )
+    # 与 main.py 生成同一份筛选 Prompt 公共部分：它是筛选缓存键的一部分，不一致时取回的结果不会被命中
+    preamble = llm_agent.format_structure_prompt(zotero_ops.get_existing_structure_cached())
+    batch_id, keys = llm_agent.submit_filter_batch(list(metadata.values()), preamble)
+    if batch_id is None:
+        print("✅ 所有论文的筛选结果均已缓存，无需提交")
+        return
+    utils.write_json(_state_path(date), {"batch_id": batch_id, "keys": keys}, indent=True)
+    print(f"📤 已提交 Batch 任务 {batch_id}，共 {len(keys)} 篇")
+
+
+def collect(date):
+    path = _state_path(date)
+    if not os.path.exists(path):
+        print(f"❌ 未找到 {date} 的 Batch 任务记录，请先运行 submit")
+        return
+    state = utils.read_json(path)
+    saved = llm_agent.collect_filter_batch(state['batch_id'], state['keys'])
+    if saved is None:
+        print("⏳ 任务尚未完成，稍后再试")
+        return
+    os.remove(path)
+    print(f"✅ 已写入 {saved}/{len(state['keys'])} 条筛选结果到缓存")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action', choices=['submit', 'collect'])
+    parser.add_argument('--date', type=str, help='YYYY-MM-DD', default=None)
+    args = parser.parse_args()
+
+    date = args.date or datetime.datetime.now().strftime('%Y-%m-%d')
+    if args.action == 'submit':
+        submit(date)
+    else:
+        collect(date)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+将 config.yaml 预编译为 config_compiled.py，之后启动时跳过 YAML 解析
+用法: python scripts/compile_config.py [config.yaml] [config_compiled.py]
+
+注意: 生成的文件包含 API Key，已加入 .gitignore，请勿提交
+"""
+import sys
+import pprint
+import yaml
+
+
+def main():
+    config_path = sys.argv[1] if len(sys.argv) > 1 else 'config.yaml'
+    compiled_path = sys.argv[2] if len(sys.argv) > 2 else 'config_compiled.py'
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    with open(compiled_path, 'w', encoding='utf-8') as f:
+        f.write(f"# 由 scripts/compile_config.py 从 {config_path} 自动生成，请勿手动修改\n")
+        f.write("CONFIG = ")
+        f.write(pprint.pformat(config, width=120, sort_dicts=False))
+        f.write("\n")
+
+    print(f"✅ 已生成预编译配置: {compiled_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+本地缓存模块 - 基于 SQLite 的持久化键值缓存
+用于跳过重复的 LLM 请求（重复提交、v2 修订版等摘要几乎相同的论文）
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from src import utils
+
+# 按数据库路径复用缓存实例
+_instances = {}
+_instances_lock = threading.Lock()
+
+_NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本：小写、去标点、合并空白，使仅有格式差异的文本得到相同的键"""
+    return _NON_WORD_RE.sub(' ', (text or '').lower()).strip()
+
+
+def make_key(*parts) -> str:
+    """由若干字段生成稳定的缓存键"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\x1f')
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """线程安全的 SQLite 键值缓存，支持 TTL 过期与 LRU 容量淘汰"""
+
+    def __init__(self, db_path: str, ttl_days: float = 30, max_entries: int = 10000):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else None
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._evict()
+
+    def get(self, namespace: str, key: str):
+        """读取缓存，未命中或已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key))
+                return None
+            self._conn.execute(
+                'UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                (now, namespace, key)
+            )
+        try:
+            return utils.json_loads(value)
+        except ValueError:
+            return None
+
+    def set(self, namespace: str, key: str, value):
+        """写入缓存"""
+        now = time.time()
+        payload = utils.json_dumps(value)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+                (namespace, key, payload, now, now)
+            )
+
+    def _evict(self):
+        """清理过期条目，并按最近访问时间淘汰超出容量的条目"""
+        with self._lock:
+            if self.ttl_seconds:
+                self._conn.execute('DELETE FROM cache WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+            if self.max_entries:
+                self._conn.execute("""
+                    DELETE FROM cache WHERE rowid IN (
+                        SELECT rowid FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+
+
+def get_cache(cache_config: dict):
+    """根据配置获取缓存实例，未启用时返回 None"""
+    cache_config = cache_config or {}
+    if not cache_config.get('enabled', True):
+        return None
+
+    db_path = os.path.join(cache_config.get('dir', '.cache'), 'responses.sqlite')
+    with _instances_lock:
+        if db_path not in _instances:
+            try:
+                _instances[db_path] = ResponseCache(
+                    db_path,
+                    ttl_days=cache_config.get('ttl_days', 30),
+                    max_entries=cache_config.get('max_entries', 10000)
+                )
+            except Exception as e:
+                print(f"⚠️ 缓存初始化失败，已禁用缓存: {e}")
+                _instances[db_path] = None
+        return _instances[db_path]
@@ -0,0 +1,44 @@
+"""
+配置加载模块 - 统一读取 config.yaml，各模块共享同一份配置
+若存在由 scripts/compile_config.py 生成且不旧于 config.yaml 的 config_compiled.py，
+则直接导入其中的字典（跳过 YAML 解析）
+"""
+import os
+import importlib.util
+
+CONFIG_PATH = 'config.yaml'
+COMPILED_PATH = 'config_compiled.py'
+
+
+def _load_compiled(compiled_path: str, config_path: str):
+    """加载预编译配置，不存在或已过期返回 None"""
+    try:
+        if os.path.getmtime(compiled_path) < os.path.getmtime(config_path):
+            return None
+    except OSError:
+        return None
+
+    try:
+        spec = importlib.util.spec_from_file_location('config_compiled', compiled_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.CONFIG
+    except Exception as e:
+        print(f"⚠️ 预编译配置加载失败，改用 YAML: {e}")
+        return None
+
+
+def load_config(config_path: str = CONFIG_PATH, compiled_path: str = COMPILED_PATH) -> dict:
+    """读取配置：优先预编译模块，否则解析 YAML"""
+    config = _load_compiled(compiled_path, config_path)
+    if config is not None:
+        return config
+
+    # 只有需要解析 YAML 时才导入 PyYAML；编译了 libyaml 时使用 C 实现的加载器，否则回退到纯 Python 版本
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=loader)
+
+
+config = load_config()
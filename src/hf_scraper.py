@@ -1,4 +1,6 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import datetime
 import re
@@ -8,6 +10,27 @@ import urllib3
 # 禁用 SSL 警告（某些代理环境需要）
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+try:
+    from selectolax.parser import HTMLParser  # 可选：C 实现的解析器，比 html.parser 快一个数量级
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml  # noqa: F401
+    _BS_PARSER = 'lxml'
+except ImportError:
+    _BS_PARSER = 'html.parser'
+
+# Arxiv ID 格式通常是 4位数字.4或5位数字 (例如 2405.12345)
+_ARXIV_RE = re.compile(r'^\d{4}\.\d{4,5}$')
+
+# 模块级会话：复用连接，并对连接错误/429/5xx 自动退避重试
+_SESSION = requests.Session()
+_SESSION.headers.update({'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'})
+_retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset(['GET']), raise_on_status=False)
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=_retry))
+_SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=_retry))
+
 def get_proxies_from_env():
     """
     从环境变量自动检测代理设置
@@ -24,6 +47,18 @@ def get_proxies_from_env():
     
     return proxies
 
+def _iter_paper_hrefs(html):
+    """遍历页面中所有以 /papers/ 开头的链接（CSS 选择器预过滤，不逐个检查全部 <a>）"""
+    if HTMLParser is not None:
+        for node in HTMLParser(html).css('a[href^="/papers/"]'):
+            href = node.attributes.get('href')
+            if href:
+                yield href
+    else:
+        soup = BeautifulSoup(html, _BS_PARSER)
+        for link in soup.select('a[href^="/papers/"]'):
+            yield link['href']
+
 def get_daily_papers(date_str=None):
     """
     获取 HuggingFace Daily Papers 的 Arxiv ID 列表
@@ -35,8 +70,6 @@ def get_daily_papers(date_str=None):
     url = f"https://huggingface.co/papers?date={date_str}"
     print(f"正在抓取: {url}")
     
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'}
-    
     # 从环境变量获取代理（如果有设置）
     proxies = get_proxies_from_env()
     if proxies:
@@ -44,7 +77,6 @@ def get_daily_papers(date_str=None):
     
     # 请求配置
     req_kwargs = {
-        'headers': headers,
         'timeout': 30,
     }
     
@@ -55,14 +87,14 @@ def get_daily_papers(date_str=None):
         req_kwargs['verify'] = False
     
     try:
-        resp = requests.get(url, **req_kwargs)
+        resp = _SESSION.get(url, **req_kwargs)
     except requests.exceptions.ProxyError as e:
         print(f"代理连接失败: {e}")
         print("尝试不使用代理...")
         req_kwargs.pop('proxies', None)
         req_kwargs.pop('verify', None)
         try:
-            resp = requests.get(url, **req_kwargs)
+            resp = _SESSION.get(url, **req_kwargs)
         except Exception as e2:
             print(f"无代理请求也失败: {e2}")
             return []
@@ -71,7 +103,7 @@ def get_daily_papers(date_str=None):
         print("尝试跳过SSL验证...")
         req_kwargs['verify'] = False
         try:
-            resp = requests.get(url, **req_kwargs)
+            resp = _SESSION.get(url, **req_kwargs)
         except Exception as e2:
             print(f"跳过SSL后仍失败: {e2}")
             return []
@@ -86,25 +118,20 @@ def get_daily_papers(date_str=None):
             print(f"尝试访问: https://huggingface.co/papers 查看最新论文")
         return []
 
-    soup = BeautifulSoup(resp.text, 'html.parser')
-    
     papers = set()
     
-    # 查找所有的文章链接
-    for link in soup.find_all('a', href=True):
-        href = link['href']
-        
-        # 链接必须以 /papers/ 开头
-        if href.startswith('/papers/') and not 'submit' in href:
+    # 查找所有的文章链接（链接必须以 /papers/ 开头）
+    for href in _iter_paper_hrefs(resp.text):
+        if not 'submit' in href:
             # 提取最后一部分，例如 2405.12345#community
             raw_id = href.split('/')[-1]
             
             # 1. 清理：去掉 ? 后面的参数和 # 后面的锚点
             clean_id = raw_id.split('?')[0].split('#')[0]
             
-            # 2. 校验：Arxiv ID 格式通常是 4位数字.4或5位数字 (例如 2405.12345)
-            # 这一步会过滤掉日期链接 (2026-02-05)
-            if re.match(r'^\d{4}\.\d{4,5}$', clean_id):
+            # 2. 校验：这一步会过滤掉日期链接 (2026-02-05)
+            #    先用长度和小数点位置快速排除，再做正则匹配
+            if 9 <= len(clean_id) <= 10 and clean_id[4] == '.' and _ARXIV_RE.match(clean_id):
                 papers.add(clean_id)
     
     # 转换为列表
@@ -1,15 +1,106 @@
-from openai import OpenAI
-import json
-import yaml
+import re
 import time
+import functools
+import threading
+import contextlib
+from src import cache, utils
+from src.config import config
+
+@functools.lru_cache(maxsize=1)
+def get_client():
+    """首次使用时才导入 openai 并创建客户端（仅导入本模块时不产生开销）"""
+    from openai import OpenAI
+    return OpenAI(
+        api_key=config['openai']['api_key'],
+        base_url=config['openai']['base_url'],
+        http_client=utils.get_http_client()
+    )
+
+
+class EndpointPool:
+    """
+    多端点负载均衡（openai.endpoints）
+    - 在途请求最少的端点优先；每个端点可设 concurrency_limit，全部占满时等待空闲名额
+    - 请求失败的端点冷却一段时间，其间优先使用其他端点；重试时自然切换到别的端点
+    """
 
-with open('config.yaml', 'r', encoding='utf-8') as f:
-    config = yaml.safe_load(f)
-
-client = OpenAI(
-    api_key=config['openai']['api_key'],
-    base_url=config['openai']['base_url']
-)
+    def __init__(self, endpoints, cooldown=30):
+        self._endpoints = endpoints
+        self._cooldown = cooldown
+        self._inflight = [0] * len(endpoints)
+        self._blocked_until = [0.0] * len(endpoints)
+        self._served = [0] * len(endpoints)
+        self._cond = threading.Condition()
+
+    def _pick(self):
+        """选出负载最低的端点（调用方持有锁），无空闲名额时返回 None"""
+        now = time.time()
+        free = [
+            i for i, ep in enumerate(self._endpoints)
+            if not ep['limit'] or self._inflight[i] < ep['limit']
+        ]
+        healthy = [i for i in free if self._blocked_until[i] <= now] or free
+        if not healthy:
+            return None
+        # 在途请求最少者优先，相同时按累计请求数轮转
+        return min(healthy, key=lambda i: (self._inflight[i], self._served[i]))
+
+    @contextlib.contextmanager
+    def acquire(self):
+        """占用一个端点，返回 (client, model)"""
+        with self._cond:
+            idx = self._pick()
+            while idx is None:
+                self._cond.wait()
+                idx = self._pick()
+            self._inflight[idx] += 1
+            self._served[idx] += 1
+        ok = False
+        try:
+            ep = self._endpoints[idx]
+            yield ep['client'](), ep['model']
+            ok = True
+        finally:
+            with self._cond:
+                self._inflight[idx] -= 1
+                if not ok and len(self._endpoints) > 1:
+                    self._blocked_until[idx] = time.time() + self._cooldown
+                self._cond.notify()
+
+    def models(self):
+        """池中所有端点的模型（去重，默认端点的模型在前）"""
+        return list(dict.fromkeys(ep['model'] for ep in self._endpoints))
+
+
+@functools.lru_cache(maxsize=1)
+def get_endpoint_pool():
+    """由配置构建端点池；未配置 openai.endpoints 时只有默认端点"""
+    openai_cfg = config.get('openai', {})
+    endpoints = [{
+        'client': get_client,
+        'model': openai_cfg.get('model'),
+        'limit': openai_cfg.get('concurrency_limit')
+    }]
+    for ep in openai_cfg.get('endpoints') or []:
+        endpoints.append({
+            'client': functools.partial(_make_client, ep['api_key'], ep['base_url']),
+            'model': ep.get('model') or openai_cfg.get('model'),
+            'limit': ep.get('concurrency_limit')
+        })
+    return EndpointPool(endpoints, cooldown=openai_cfg.get('endpoint_cooldown', 30))
+
+
+@functools.lru_cache(maxsize=None)
+def _make_client(api_key, base_url):
+    """为额外端点创建客户端（每个端点一个），共用同一个 HTTP 连接池"""
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=utils.get_http_client())
+
+
+def chat_completion(**kwargs):
+    """经端点池发起一次 chat.completions 请求（model 由所选端点决定），返回 (response, 实际使用的 model)"""
+    with get_endpoint_pool().acquire() as (client, model):
+        return client.chat.completions.create(model=model, **kwargs), model
 
 # 从配置读取LLM参数
 openai_config = config.get('openai', {})
@@ -17,16 +108,70 @@ llm_timeout = openai_config.get('timeout', 60)
 llm_max_retries = openai_config.get('max_retries', 3)
 llm_retry_delay = openai_config.get('retry_delay', 5)
 
+@functools.lru_cache(maxsize=1)
+def get_response_cache():
+    """本地响应缓存：首次使用时才打开 SQLite 并淘汰过期条目（导入本模块不触发），未启用时为 None"""
+    return cache.get_cache(config.get('cache', {}))
+
+# 筛选结果的 JSON Schema：服务端支持严格结构化输出时（openai.json_schema: true）启用，避免解析失败重试
+_FILTER_RESULT_PROPERTIES = {
+    "interested": {"type": "boolean"},
+    "reason": {"type": "string"},
+    "category": {"type": "string"},
+    "tags": {"type": "array", "items": {"type": "string"}},
+    "summary_cn": {"type": "string"},
+    "tricks_cn": {"type": "string"}
+}
+
+def _json_schema_format(name, properties):
+    """构造 strict 模式的 response_format"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False
+            }
+        }
+    }
 
-
-def analyze_paper_with_structure(title, abstract, zotero_structure):
+if openai_config.get('json_schema', False):
+    filter_response_format = _json_schema_format("paper_analysis", _FILTER_RESULT_PROPERTIES)
+    filter_batch_response_format = _json_schema_format("paper_analysis_batch", {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"idx": {"type": "integer"}, **_FILTER_RESULT_PROPERTIES},
+                "required": ["idx", *_FILTER_RESULT_PROPERTIES],
+                "additionalProperties": False
+            }
+        }
+    })
+else:
+    filter_response_format = filter_batch_response_format = {"type": "json_object"}
+
+# 筛选请求的额外参数：服务端支持时带上 prompt_cache_key，让相同的 system 前缀命中 KV 缓存
+filter_extra_body = {}
+if openai_config.get('prompt_cache_key'):
+    filter_extra_body['prompt_cache_key'] = openai_config['prompt_cache_key']
+
+
+
+def format_structure_prompt(zotero_structure):
     """
-    RAG 模式分析：参考现有 Zotero 结构进行分类和打标
+    筛选 Prompt 的公共部分：用户兴趣、Zotero 参考结构与任务说明
+    结构在一次运行中不变，调用方应只生成一次，再把字符串传给各筛选函数
+    作为 system 消息发送：内容逐字节稳定（排序、无时间戳），便于服务端前缀缓存
     """
-    existing_cats = zotero_structure.get('collections', [])
-    existing_tags = zotero_structure.get('tags', [])
-    
-    prompt = f"""
+    existing_cats = sorted(zotero_structure.get('collections', []))
+    existing_tags = sorted(zotero_structure.get('tags', []))
+
+    return f"""
     Role: Senior AI Researcher.
     
     User Interests: 
@@ -38,8 +183,8 @@ def analyze_paper_with_structure(title, abstract, zotero_structure):
     User Ignores: Pure entertainment generation (Music/Art) unless technically novel.
 
     **Reference Context (Existing Zotero Library):**
-    - Existing Categories: {json.dumps(existing_cats)}
-    - Frequent Tags: {json.dumps(existing_tags)}
+    - Existing Categories: {utils.json_dumps(existing_cats)}
+    - Frequent Tags: {utils.json_dumps(existing_tags)}
 
     Task:
     1. **Interest Check**: Decide if the paper matches user interests.
@@ -53,7 +198,47 @@ def analyze_paper_with_structure(title, abstract, zotero_structure):
     4. **Extraction**: 
        - 'summary_cn': One sentence summary in Chinese.
        - 'tricks_cn': Key tricks/findings in Chinese.
+"""
+
+
+def _filter_preamble(zotero_structure):
+    """兼容传入结构 dict 或已生成的 Prompt 字符串"""
+    if isinstance(zotero_structure, str):
+        return zotero_structure
+    return format_structure_prompt(zotero_structure)
+
+
+def _prompt_cache_key(model, *prompt_parts):
+    """汇总/笔记类请求按 (模型, 完整 Prompt) 精确缓存：输入完全相同时直接复用历史结果"""
+    return cache.make_key(model, *prompt_parts)
+
+
+def _filter_cache_key(model, preamble, title, abstract):
+    """
+    归一化标题+摘要作为缓存键，重复提交或修订版论文直接复用历史结果
+    键中包含筛选 Prompt 公共部分（用户兴趣 + Zotero 现有分类/标签）：分类与标签依赖它，库结构或兴趣变化后重新筛选
+    """
+    return cache.make_key(model, preamble, cache.normalize_text(title), cache.normalize_text(abstract))
+
+
+def cache_lookup(namespace, make_key):
+    """
+    查询响应缓存，返回 (结果, 产生该结果的 model)，未命中时为 (None, None)
+    缓存按实际服务请求的端点模型写入；读取时依次尝试端点池中的各模型（默认模型优先），
+    池内端点视为可互换，任一模型产出的结果都可以复用
+    """
+    response_cache = get_response_cache()
+    if response_cache:
+        for model in get_endpoint_pool().models():
+            cached = response_cache.get(namespace, make_key(model))
+            if cached is not None:
+                return cached, model
+    return None, None
 
+
+def _filter_messages(title, abstract, preamble):
+    """单篇筛选请求的 messages：system 为公共 Prompt，user 只携带本篇论文"""
+    prompt = f"""
     Input:
     Title: {title}
     Abstract: {abstract}
@@ -70,28 +255,226 @@ def analyze_paper_with_structure(title, abstract, zotero_structure):
 
     注意：reason 字段必须用中文回答，说明论文与用户兴趣的匹配程度。
     """
-    
+    return [
+        {"role": "system", "content": preamble},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def analyze_paper_with_structure(title, abstract, zotero_structure):
+    """
+    RAG 模式分析：参考现有 Zotero 结构进行分类和打标
+    zotero_structure 可以是结构 dict，也可以是 format_structure_prompt 的结果
+    """
+    response_cache = get_response_cache()
+    preamble = _filter_preamble(zotero_structure)
+    cached, _ = cache_lookup('paper_filter', lambda model: _filter_cache_key(model, preamble, title, abstract))
+    if cached is not None:
+        return cached
+
+    messages = _filter_messages(title, abstract, preamble)
     for i in range(llm_max_retries):
         try:
-            response = client.chat.completions.create(
-                model=config['openai']['model'],
-                messages=[{"role": "user", "content": prompt}],
-                response_format={"type": "json_object"},
-                timeout=llm_timeout
+            response, model = chat_completion(
+                messages=messages,
+                response_format=filter_response_format,
+                timeout=llm_timeout,
+                extra_body=filter_extra_body or None
             )
-            return json.loads(response.choices[0].message.content)
+            result = utils.json_loads(response.choices[0].message.content)
+            if response_cache:
+                response_cache.set('paper_filter', _filter_cache_key(model, preamble, title, abstract), result)
+            return result
         except Exception as e:
             print(f"  LLM分析尝试 {i+1}/{llm_max_retries} 失败: {e}")
-            if i == llm_max_retries - 1:
+            delay = utils.backoff_delay(e, i, llm_retry_delay)
+            if i == llm_max_retries - 1 or delay is None:
                 print(f"  LLM Analyze Error: {e}")
-                return {"interested": False}
-            time.sleep(llm_retry_delay)
+                # 带 failed 标记：调用方不会把它当作「不感兴趣」记入断点，下次运行会重新筛选
+                return {"interested": False, "failed": True}
+            time.sleep(delay)
 
-def generate_reading_note(title, authors, abstract, analysis_data):
+
+def analyze_papers_batch(papers: list, zotero_structure) -> list:
     """
-    生成详细中文笔记，使用用户指定的高质量模板
+    批量筛选：一次 LLM 调用分析多篇论文，公共 Prompt 只发送一次
+
+    Args:
+        papers: 论文列表，每个元素是 dict 包含 title 和 summary
+        zotero_structure: Zotero 现有结构（dict 或 format_structure_prompt 生成的字符串）
+
+    Returns:
+        list: 与 papers 一一对应的分析结果，批量结果缺失的论文回退到单篇分析
     """
-    note_template = """
+    response_cache = get_response_cache()
+    preamble = _filter_preamble(zotero_structure)
+    results = [None] * len(papers)
+    pending = []
+    for idx, paper in enumerate(papers):
+        cached, _ = cache_lookup(
+            'paper_filter', lambda model: _filter_cache_key(model, preamble, paper['title'], paper['summary'])
+        )
+        if cached is not None:
+            results[idx] = cached
+        else:
+            pending.append(idx)
+
+    if len(pending) > 1:
+        papers_text = []
+        for idx in pending:
+            papers_text.append(f"""
+    === Paper {idx} ===
+    Title: {papers[idx]['title']}
+    Abstract: {papers[idx]['summary']}
+""")
+
+        prompt = f"""
+    Analyze EACH of the following {len(pending)} papers independently.
+
+    Input:
+    {"".join(papers_text)}
+
+    Return JSON strictly, one entry per paper in input order, "idx" copied from "=== Paper idx ===":
+    {{
+        "results": [
+            {{
+                "idx": 0,
+                "interested": true/false,
+                "reason": "用中文简要说明为什么这篇论文符合或不符合用户兴趣，1-2句话",
+                "category": "CategoryName",
+                "tags": ["tag1", "tag2"],
+                "summary_cn": "中文一句话总结",
+                "tricks_cn": "关键技巧或结论(中文)"
+            }}
+        ]
+    }}
+
+    注意：reason 字段必须用中文回答，说明论文与用户兴趣的匹配程度。
+    """
+
+        messages = [
+            {"role": "system", "content": preamble},
+            {"role": "user", "content": prompt}
+        ]
+        for attempt in range(llm_max_retries):
+            try:
+                response, model = chat_completion(
+                    messages=messages,
+                    response_format=filter_batch_response_format,
+                    timeout=llm_timeout * 2,  # 批量请求输出更长
+                    extra_body=filter_extra_body or None
+                )
+                items = utils.json_loads(response.choices[0].message.content).get('results', [])
+                by_idx = {item.get('idx'): item for item in items if isinstance(item, dict)}
+                for idx in pending:
+                    item = by_idx.get(idx)
+                    if item is None or 'interested' not in item:
+                        continue
+                    item.pop('idx', None)
+                    results[idx] = item
+                    if response_cache:
+                        cache_key = _filter_cache_key(model, preamble, papers[idx]['title'], papers[idx]['summary'])
+                        response_cache.set('paper_filter', cache_key, item)
+                break
+            except Exception as e:
+                print(f"  批量筛选尝试 {attempt + 1}/{llm_max_retries} 失败: {e}")
+                delay = utils.backoff_delay(e, attempt, llm_retry_delay)
+                if delay is None:
+                    break
+                if attempt < llm_max_retries - 1:
+                    time.sleep(delay)
+
+    for idx, result in enumerate(results):
+        if result is None:
+            results[idx] = analyze_paper_with_structure(papers[idx]['title'], papers[idx]['summary'], preamble)
+    return results
+
+def submit_filter_batch(papers: list, zotero_structure):
+    """
+    把未命中缓存的筛选请求提交到 OpenAI Batch API（异步执行，价格约为在线调用的一半，24 小时内完成）
+    结果由 collect_filter_batch 写入筛选缓存，之后正常运行 main.py 时直接命中
+
+    Returns:
+        (batch_id, {custom_id: cache_key})，没有需要提交的论文时 batch_id 为 None
+    """
+    preamble = _filter_preamble(zotero_structure)
+    lines, keys = [], {}
+    for idx, paper in enumerate(papers):
+        # Batch API 只走默认端点，结果按默认模型写入缓存
+        cache_key = _filter_cache_key(config['openai']['model'], preamble, paper['title'], paper['summary'])
+        if cache_key in keys.values():
+            continue
+        cached, _ = cache_lookup(
+            'paper_filter', lambda model: _filter_cache_key(model, preamble, paper['title'], paper['summary'])
+        )
+        if cached is not None:
+            continue
+        custom_id = f"paper-{idx}"
+        keys[custom_id] = cache_key
+        body = {
+            "model": config['openai']['model'],
+            "messages": _filter_messages(paper['title'], paper['summary'], preamble),
+            "response_format": filter_response_format
+        }
+        if filter_extra_body:
+            body.update(filter_extra_body)
+        lines.append(utils.json_dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": body
+        }))
+    if not lines:
+        return None, keys
+
+    client = get_client()
+    input_file = client.files.create(
+        file=("paper_filter.jsonl", ("\n".join(lines) + "\n").encode('utf-8')),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    return batch.id, keys
+
+
+def collect_filter_batch(batch_id, keys: dict):
+    """
+    取回 Batch 任务结果并写入筛选缓存
+
+    Returns:
+        写入缓存的条数；任务尚未完成时返回 None
+    """
+    response_cache = get_response_cache()
+    client = get_client()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        print(f"  Batch 任务状态: {batch.status}")
+        return None
+    if not batch.output_file_id or not response_cache:
+        return 0
+
+    saved = 0
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        record = utils.json_loads(line)
+        cache_key = keys.get(record.get('custom_id'))
+        response = record.get('response') or {}
+        if not cache_key or response.get('status_code') != 200:
+            continue
+        try:
+            result = utils.json_loads(response['body']['choices'][0]['message']['content'])
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+        response_cache.set('paper_filter', cache_key, result)
+        saved += 1
+    return saved
+
+# 读书笔记模板（模块级常量）；与固定的 system 指令一起构成逐字节稳定的前缀，便于服务端前缀缓存
+_NOTE_TEMPLATE = """
     ### 科研论文读书笔记
 
     **论文标题**: {Title}
@@ -163,7 +546,31 @@ def generate_reading_note(title, authors, abstract, analysis_data):
     2. 拒绝翻译腔，直接写中文或英文术语，不要中英文混用括号，严禁出现英文原文段落。
     3. 深度总结，不要只翻译摘要，要根据摘要内容进行合理的逻辑推演和扩展。
     """
-    
+
+_NOTE_SYSTEM_PROMPT = f"You are a helpful research assistant.\n\nTemplate:\n{_NOTE_TEMPLATE}"
+
+
+def _stream_completion_text(**kwargs):
+    """
+    以流式方式调用 chat.completions 并拼接文本，返回 (文本, 实际使用的 model)
+    长文本生成时超时按相邻分片计算，不会因整体生成耗时过长而超时；分片只在结尾拼接一次
+    """
+    parts = []
+    with get_endpoint_pool().acquire() as (client, model):
+        for chunk in client.chat.completions.create(model=model, stream=True, **kwargs):
+            if chunk.choices:
+                content = chunk.choices[0].delta.content
+                if content:
+                    parts.append(content)
+    return ''.join(parts), model
+
+
+def generate_reading_note(title, authors, abstract, analysis_data):
+    """
+    生成详细中文笔记，使用用户指定的高质量模板
+    模板放在 system 消息中，user 消息只携带本篇论文的信息
+    """
+    response_cache = get_response_cache()
     user_input = f"""
     Title: {title}
     Authors: {authors}
@@ -172,21 +579,31 @@ def generate_reading_note(title, authors, abstract, analysis_data):
     
     Please generate the note following the template strictly.
     """
-    
-    try:
-        response = client.chat.completions.create(
-            model=config['openai']['model'],
-            messages=[
-                {"role": "system", "content": "You are a helpful research assistant."},
-                {"role": "user", "content": f"Template:\n{note_template}\n\nTask:\n{user_input}"}
-            ]
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"笔记生成失败: {e}"
 
+    cached, _ = cache_lookup('reading_note', lambda model: _prompt_cache_key(model, _NOTE_SYSTEM_PROMPT, user_input))
+    if cached is not None:
+        return cached
+    
+    messages = [
+        {"role": "system", "content": _NOTE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Task:\n{user_input}"}
+    ]
+    for attempt in range(llm_max_retries):
+        try:
+            note, model = _stream_completion_text(
+                messages=messages,
+                timeout=llm_timeout
+            )
+            if response_cache and note:
+                response_cache.set('reading_note', _prompt_cache_key(model, _NOTE_SYSTEM_PROMPT, user_input), note)
+            return note
+        except Exception as e:
+            print(f"  笔记生成尝试 {attempt + 1}/{llm_max_retries} 失败: {e}")
+            delay = utils.backoff_delay(e, attempt, llm_retry_delay)
+            if attempt == llm_max_retries - 1 or delay is None:
+                return f"笔记生成失败: {e}"
+            time.sleep(delay)
 
-# ... (前面的代码保持不变) ...
 
 def generate_daily_overview(interested_papers, ignored_papers):
     """
@@ -215,8 +632,7 @@ def generate_daily_overview(interested_papers, ignored_papers):
     """
 
     try:
-        response = client.chat.completions.create(
-            model=config['openai']['model'],
+        response, _ = chat_completion(
             messages=[{"role": "user", "content": prompt}]
         )
         return response.choices[0].message.content
@@ -224,53 +640,88 @@ def generate_daily_overview(interested_papers, ignored_papers):
         return "今日综述生成失败。"
 
 
-def summarize_papers_batch(papers_notes: list, batch_idx: int) -> dict:
-    """
-    对一批论文（最多10篇）进行小汇总
+# 每篇论文「方法概述 + 实验结果」两段合计的 token 预算；一段较短时，剩余预算留给另一段
+_HIGHLIGHT_TOKEN_BUDGET = 400
 
-    Args:
-        papers_notes: 论文笔记内容列表，每个元素是 dict 包含 note_content 和 metadata
-        batch_idx: 批次编号
 
-    Returns:
-        dict: 包含 batch_summary（文本摘要）和 papers_highlights（每篇论文要点）
-    """
-    if not papers_notes:
-        return {"batch_summary": "", "papers_highlights": []}
+def _fit_token_budget(texts, budget):
+    """在总预算内截断多段文本：先按平均份额分配，较短的段落用不完的份额分给其余段落"""
+    costs = [utils.estimate_tokens(t) for t in texts]
+    shares = [0] * len(texts)
+    remaining, pending = budget, sorted(range(len(texts)), key=costs.__getitem__)
+    while pending:
+        share = remaining // len(pending)
+        idx = pending.pop(0)
+        shares[idx] = min(costs[idx], share)
+        remaining -= shares[idx]
+    return [utils.truncate_tokens(t, n) for t, n in zip(texts, shares)]
+
 
-    # 构建输入文本
-    papers_text = []
+def _format_papers_notes(papers_notes: list) -> str:
+    """把论文笔记整理成批次汇总 Prompt 的输入文本（每篇一段，直接拼成一个字符串）"""
+    return chr(10).join(_iter_paper_blocks(papers_notes))
+
+
+def _iter_paper_blocks(papers_notes: list):
+    """逐篇生成论文文本段落"""
     for idx, paper in enumerate(papers_notes, 1):
-        text = f"""
+        # 每个字段只取一次
+        get = paper.get
+        method_summary, key_results = _fit_token_budget(
+            [str(get('method_summary') or ''), str(get('key_results') or '')],
+            _HIGHLIGHT_TOKEN_BUDGET
+        )
+        contribution = get('core_contribution', '')
+        if isinstance(contribution, list):
+            contribution = chr(10).join(contribution)
+        highlights = chr(10).join('- ' + p for p in get('pros', [])[:2])
+        yield f"""
 === 论文 {idx} ===
-标题: {paper.get('title', '')}
-中文标题: {paper.get('title_cn', '')}
-作者: {', '.join(paper.get('authors', [])[:3])}
-类别: {paper.get('category', '')}
+标题: {get('title', '')}
+中文标题: {get('title_cn', '')}
+作者: {', '.join(get('authors', [])[:3])}
+类别: {get('category', '')}
 
 核心问题:
-{paper.get('core_problem', '')}
+{get('core_problem', '')}
 
 核心贡献:
-{chr(10).join(paper.get('core_contribution', [])) if isinstance(paper.get('core_contribution'), list) else paper.get('core_contribution', '')}
+{contribution}
 
 方法概述:
-{paper.get('method_summary', '')[:500]}...
+{method_summary}
 
 实验结果:
-{paper.get('key_results', '')[:400]}...
+{key_results}
 
 亮点:
-{chr(10).join(['- ' + p for p in paper.get('pros', [])[:2]])}
+{highlights}
 """
-        papers_text.append(text)
+
+
+def summarize_papers_batch(papers_notes: list, batch_idx: int) -> dict:
+    """
+    对一批论文（最多10篇）进行小汇总
+
+    Args:
+        papers_notes: 论文笔记内容列表，每个元素是 dict 包含 note_content 和 metadata
+        batch_idx: 批次编号
+
+    Returns:
+        dict: 包含 batch_summary（文本摘要）和 papers_highlights（每篇论文要点）
+    """
+    response_cache = get_response_cache()
+    if not papers_notes:
+        return {"batch_summary": "", "papers_highlights": []}
+
+    papers_text = _format_papers_notes(papers_notes)
 
     prompt = f"""
 Role: 资深AI研究分析师
 Task: 对以下 {len(papers_notes)} 篇论文进行批次汇总分析（批次 #{batch_idx + 1}）
 
 输入论文内容:
-{chr(10).join(papers_text)}
+{papers_text}
 
 请按以下JSON格式返回分析结果:
 {{
@@ -293,25 +744,33 @@ Task: 对以下 {len(papers_notes)} 篇论文进行批次汇总分析（批次 #
 4. 所有输出必须是中文
 """
 
+    cached, _ = cache_lookup('batch_summary', lambda model: _prompt_cache_key(model, prompt))
+    if cached is not None:
+        return cached
+
+    messages = [{"role": "user", "content": prompt}]
     for attempt in range(llm_max_retries):
         try:
-            response = client.chat.completions.create(
-                model=config['openai']['model'],
-                messages=[{"role": "user", "content": prompt}],
+            response, model = chat_completion(
+                messages=messages,
                 response_format={"type": "json_object"},
                 timeout=llm_timeout
             )
-            result = json.loads(response.choices[0].message.content)
+            result = utils.json_loads(response.choices[0].message.content)
+            if response_cache:
+                response_cache.set('batch_summary', _prompt_cache_key(model, prompt), result)
             return result
         except Exception as e:
             print(f"  批次 {batch_idx + 1} 汇总尝试 {attempt + 1}/{llm_max_retries} 失败: {e}")
-            if attempt == llm_max_retries - 1:
+            delay = utils.backoff_delay(e, attempt, llm_retry_delay)
+            if attempt == llm_max_retries - 1 or delay is None:
                 return {
                     "batch_summary": f"批次 {batch_idx + 1} 汇总失败",
                     "technical_trends": [],
-                    "papers_highlights": []
+                    "papers_highlights": [],
+                    "failed": True
                 }
-            time.sleep(llm_retry_delay)
+            time.sleep(delay)
 
 
 def generate_final_daily_report(batch_summaries: list, all_papers_count: int, date: str) -> dict:
@@ -326,16 +785,16 @@ def generate_final_daily_report(batch_summaries: list, all_papers_count: int, da
     Returns:
         dict: 包含完整日报的各个部分
     """
+    response_cache = get_response_cache()
     # 构建批次汇总文本
-    batches_text = []
-    for idx, batch in enumerate(batch_summaries, 1):
-        summary = batch.get('batch_summary', '')
-        trends = batch.get('technical_trends', [])
-        batches_text.append(f"""
+    batches_text = chr(10).join(
+        f"""
 === 批次 {idx} 汇总 ===
-整体趋势: {summary}
-技术趋势: {', '.join(trends)}
-""")
+整体趋势: {batch.get('batch_summary', '')}
+技术趋势: {', '.join(batch.get('technical_trends', []))}
+"""
+        for idx, batch in enumerate(batch_summaries, 1)
+    )
 
     prompt = f"""
 Role: 资深AI研究主管
@@ -344,7 +803,7 @@ Task: 基于以下各批次汇总，生成 {date} 的完整科研日报
 总体情况: 今日共分析 {all_papers_count} 篇论文，分为 {len(batch_summaries)} 个批次处理
 
 各批次汇总:
-{chr(10).join(batches_text)}
+{batches_text}
 
 请按以下JSON格式返回日报内容:
 {{
@@ -377,32 +836,150 @@ Task: 基于以下各批次汇总，生成 {date} 的完整科研日报
 6. 所有输出必须是中文，专业且流畅
 """
 
+    cached, _ = cache_lookup('daily_report', lambda model: _prompt_cache_key(model, prompt))
+    if cached is not None:
+        return cached
+
+    messages = [{"role": "user", "content": prompt}]
     for attempt in range(llm_max_retries):
         try:
-            response = client.chat.completions.create(
-                model=config['openai']['model'],
-                messages=[{"role": "user", "content": prompt}],
+            response, model = chat_completion(
+                messages=messages,
                 response_format={"type": "json_object"},
                 timeout=llm_timeout * 2  # 最终汇总给更多时间
             )
-            result = json.loads(response.choices[0].message.content)
+            result = utils.json_loads(response.choices[0].message.content)
+            if response_cache:
+                response_cache.set('daily_report', _prompt_cache_key(model, prompt), result)
             return result
         except Exception as e:
             print(f"  最终日报生成尝试 {attempt + 1}/{llm_max_retries} 失败: {e}")
-            if attempt == llm_max_retries - 1:
+            delay = utils.backoff_delay(e, attempt, llm_retry_delay)
+            if attempt == llm_max_retries - 1 or delay is None:
                 return {
                     "daily_overview": f"{date} 科研日报生成失败",
                     "key_insights": [],
                     "direction_summary": {},
                     "notable_papers": [],
-                    "future_trends": ""
+                    "future_trends": "",
+                    "failed": True
                 }
-            time.sleep(llm_retry_delay)
+            time.sleep(delay)
+
+
+def generate_report_bundle(papers_notes: list, date: str) -> tuple:
+    """
+    论文只有一个批次时，把批次汇总与最终日报合并为一次 LLM 调用
+    （论文内容只发送一次，省去一次往返）
+
+    Args:
+        papers_notes: 论文笔记内容列表（不超过一个批次）
+        date: 日期
+
+    Returns:
+        tuple: (batch_summary_dict, final_report_dict)，结构分别与
+               summarize_papers_batch 和 generate_final_daily_report 的返回值一致
+    """
+    response_cache = get_response_cache()
+    papers_text = _format_papers_notes(papers_notes)
+
+    prompt = f"""
+Role: 资深AI研究主管
+Task: 基于以下 {len(papers_notes)} 篇论文，生成 {date} 的完整科研日报
+
+输入论文内容:
+{papers_text}
+
+请按以下JSON格式返回分析结果:
+{{
+    "batch_summary": "用3-5句话概括这批论文的整体研究趋势、共同主题和技术方向（中文）",
+    "technical_trends": ["技术趋势1", "技术趋势2", "技术趋势3"],
+    "papers_highlights": [
+        {{
+            "title": "论文1标题",
+            "key_method": "该论文使用的核心方法（1句话）",
+            "key_finding": "主要发现/贡献（1句话）",
+            "result_highlight": "实验结果亮点（1句话，如有具体数据更佳）"
+        }}
+    ],
+    "daily_overview": "今日整体研究趋势概述（5-8句话，中文）",
+    "key_insights": [
+        "洞察1: 关于技术方向的深度分析",
+        "洞察2: 关于研究热点的观察",
+        "洞察3: 关于方法论的总结"
+    ],
+    "direction_summary": {{
+        "Agent": "Agent方向的小结（如有该方向论文）",
+        "Multimodal": "多模态方向的小结（如有）",
+        "RL": "强化学习方向的小结（如有）"
+    }},
+    "notable_papers": [
+        {{
+            "title": "值得关注的论文标题",
+            "why_notable": "为什么值得关注（1-2句话）"
+        }}
+    ],
+    "future_trends": "对未来研究趋势的预测或建议（3-4句话）"
+}}
+
+要求:
+1. batch_summary / technical_trends: 整体趋势分析与2-3个关键技术趋势
+2. papers_highlights: 按输入顺序为每篇论文提取方法、发现、结果三个要点
+3. daily_overview: 全面概括今日论文的整体特点、技术趋势、研究热点
+4. key_insights: 提供3-5个深度洞察，不是简单罗列，而是分析性总结
+5. direction_summary: 按研究方向分别小结，如果某方向没有则省略
+6. notable_papers: 选出2-3篇最值得关注的论文并说明原因
+7. future_trends: 基于今日论文预测未来可能的研究方向
+8. 所有输出必须是中文，专业且流畅
+"""
+
+    batch_keys = ('batch_summary', 'technical_trends', 'papers_highlights')
+    cached, _ = cache_lookup('report_bundle', lambda model: _prompt_cache_key(model, prompt))
+    if cached is not None:
+        return {k: cached.pop(k) for k in batch_keys if k in cached}, cached
+
+    messages = [{"role": "user", "content": prompt}]
+    for attempt in range(llm_max_retries):
+        try:
+            response, model = chat_completion(
+                messages=messages,
+                response_format={"type": "json_object"},
+                timeout=llm_timeout * 2
+            )
+            result = utils.json_loads(response.choices[0].message.content)
+            if response_cache:
+                response_cache.set('report_bundle', _prompt_cache_key(model, prompt), result)
+            batch_summary = {k: result.pop(k) for k in batch_keys if k in result}
+            return batch_summary, result
+        except Exception as e:
+            print(f"  合并日报生成尝试 {attempt + 1}/{llm_max_retries} 失败: {e}")
+            delay = utils.backoff_delay(e, attempt, llm_retry_delay)
+            if delay is None:
+                break
+            if attempt < llm_max_retries - 1:
+                time.sleep(delay)
+
+    # 合并调用失败时退回原来的两步流程
+    batch_summary = summarize_papers_batch(papers_notes, 0)
+    return batch_summary, generate_final_daily_report([batch_summary], len(papers_notes), date)
+
+
+# parse_note_content 用到的正则（模块级预编译）
+_NOTE_SECTION_RE = re.compile(r'^[ \t]*## (.*)$', re.MULTILINE)
+_NOTE_TITLE_RE = re.compile(r'^[ \t]*# (.*)$', re.MULTILINE)
+_NOTE_TITLE_CN_RE = re.compile(r'\*\*中文标题\*\*[:：](.*)$', re.MULTILINE)
+_NOTE_AUTHORS_RE = re.compile(r'\*\*作者\*\*[:：](.*)$', re.MULTILINE)
+
+
+def _bullet_items(section_lines: list) -> list:
+    """提取章节中的列表项（以 - 开头的行）"""
+    return [l[2:].strip() for l in section_lines if l.startswith('- ')]
 
 
 def parse_note_content(note_content: str) -> dict:
     """
     解析 note.md 内容，提取关键字段
+    用预编译正则一次切分章节，不再逐行判断所有规则
     """
     result = {
         'title': '',
@@ -416,64 +993,39 @@ def parse_note_content(note_content: str) -> dict:
         'category': ''
     }
 
-    lines = note_content.split('\n')
-    current_section = None
-    section_content = []
-
-    for line in lines:
-        line = line.strip()
-
-        # 提取标题
-        if line.startswith('# ') and not result['title']:
-            result['title'] = line[2:].strip()
-
-        # 提取中文标题
-        if '**中文标题**:' in line or '**中文标题**：' in line:
-            result['title_cn'] = line.split(':', 1)[-1].split('：', 1)[-1].strip()
-
-        # 提取作者
-        if '**作者**:' in line or '**作者**：' in line:
-            authors_str = line.split(':', 1)[-1].split('：', 1)[-1].strip()
-            result['authors'] = [a.strip() for a in authors_str.split(',')]
-
-        # 识别章节
-        if line.startswith('## '):
-            # 保存上一个章节的内容
-            if current_section == '核心问题' and section_content:
-                result['core_problem'] = '\n'.join(section_content).strip()
-            elif current_section == '核心贡献' and section_content:
-                content = '\n'.join(section_content).strip()
-                # 解析列表
-                if content.startswith('- '):
-                    result['core_contribution'] = [l[2:].strip() for l in section_content if l.strip().startswith('- ')]
-                else:
-                    result['core_contribution'] = [content]
-            elif current_section == '方法概述' and section_content:
-                result['method_summary'] = '\n'.join(section_content).strip()
-            elif current_section == '实验结果' and section_content:
-                result['key_results'] = '\n'.join(section_content).strip()
-            elif current_section == '亮点' and section_content:
-                result['pros'] = [l[2:].strip() for l in section_content if l.strip().startswith('- ')]
-
-            current_section = line[3:].strip()
-            section_content = []
-        elif current_section and line and not line.startswith('!'):
-            section_content.append(line)
-
-    # 处理最后一个章节
-    if current_section == '核心问题' and section_content:
-        result['core_problem'] = '\n'.join(section_content).strip()
-    elif current_section == '核心贡献' and section_content:
-        content = '\n'.join(section_content).strip()
-        if content.startswith('- '):
-            result['core_contribution'] = [l[2:].strip() for l in section_content if l.strip().startswith('- ')]
-        else:
-            result['core_contribution'] = [content]
-    elif current_section == '方法概述' and section_content:
-        result['method_summary'] = '\n'.join(section_content).strip()
-    elif current_section == '实验结果' and section_content:
-        result['key_results'] = '\n'.join(section_content).strip()
-    elif current_section == '亮点' and section_content:
-        result['pros'] = [l[2:].strip() for l in section_content if l.strip().startswith('- ')]
+    # 提取标题、中文标题、作者
+    match = _NOTE_TITLE_RE.search(note_content)
+    if match:
+        result['title'] = match.group(1).strip()
+    match = _NOTE_TITLE_CN_RE.search(note_content)
+    if match:
+        result['title_cn'] = match.group(1).strip()
+    match = _NOTE_AUTHORS_RE.search(note_content)
+    if match:
+        result['authors'] = [a.strip() for a in match.group(1).strip().split(',')]
+
+    # 按 "## " 切分章节：[前言, 章节名1, 内容1, 章节名2, 内容2, ...]
+    parts = _NOTE_SECTION_RE.split(note_content)
+    for i in range(1, len(parts) - 1, 2):
+        section = parts[i].strip()
+        section_content = [l for l in (raw.strip() for raw in parts[i + 1].split('\n'))
+                           if l and not l.startswith('!')]
+        if not section_content:
+            continue
+
+        if section == '核心问题':
+            result['core_problem'] = '\n'.join(section_content).strip()
+        elif section == '核心贡献':
+            # 解析列表
+            if section_content[0].startswith('- '):
+                result['core_contribution'] = _bullet_items(section_content)
+            else:
+                result['core_contribution'] = ['\n'.join(section_content).strip()]
+        elif section == '方法概述':
+            result['method_summary'] = '\n'.join(section_content).strip()
+        elif section == '实验结果':
+            result['key_results'] = '\n'.join(section_content).strip()
+        elif section == '亮点':
+            result['pros'] = _bullet_items(section_content)
 
     return result
@@ -2,20 +2,28 @@
 论文深度分析模块 - 对感兴趣的论文进行PDF转图片、OCR分析、图文报告生成
 支持并发OCR处理
 """
+import io
 import os
 import re
-import base64
-import json
+import atexit
+import queue
+import hashlib
 import time
+import threading
+import functools
+import multiprocessing
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
 from PIL import Image, ImageDraw, ImageFont
-from openai import OpenAI
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import yaml
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from src import cache, llm_agent, pdf_render, utils
+from src.config import config
 
-with open('config.yaml', 'r', encoding='utf-8') as f:
-    config = yaml.safe_load(f)
+try:
+    import pybase64 as base64  # SIMD 实现，接口与标准库一致
+except ImportError:  # pybase64 为可选依赖，缺失时回退到标准库 base64
+    import base64
 
 # 获取配置
 analysis_config = config.get('analysis', {})
@@ -23,20 +31,32 @@ concurrency_config = config.get('concurrency', {})
 ocr_config = config.get('deepseek_ocr', {})
 openai_config = config.get('openai', {})
 
-# OpenAI客户端（用于内容分析）
-client = OpenAI(
-    api_key=config['openai']['api_key'],
-    base_url=config['openai']['base_url']
-)
-
-# DeepSeek OCR客户端
-if ocr_config.get('api_key') and ocr_config.get('base_url'):
-    ocr_client = OpenAI(
-        api_key=ocr_config['api_key'],
-        base_url=ocr_config['base_url']
-    )
-else:
-    ocr_client = client
+@functools.lru_cache(maxsize=1)
+def get_ocr_client():
+    """
+    DeepSeek OCR客户端：首次使用时才创建，之后全进程复用同一个实例
+    未单独配置时复用 LLM 默认端点的客户端（内容分析经 llm_agent 端点池调用，本模块不再单独创建 LLM 客户端）
+    """
+    if ocr_config.get('api_key') and ocr_config.get('base_url'):
+        from openai import OpenAI
+        return OpenAI(
+            api_key=ocr_config['api_key'],
+            base_url=ocr_config['base_url'],
+            http_client=utils.get_http_client()
+        )
+    return llm_agent.get_client()
+
+# OCR 提示词（也是 OCR 缓存键的一部分）
+OCR_PROMPT = "<|grounding|>Convert the document to markdown."
+# 多页合并识别时的分页标记
+OCR_PAGE_SEPARATOR = "---PAGE---"
+
+# OCR 结果解析与图表标题清理用到的正则（模块级预编译，逐页/逐项复用）
+_OCR_TAG_RE = re.compile(r'(?P<type>\w+)\[\[(?P<rect>[\d,\s,]+)\]\]')
+_BBOX_SPLIT_RE = re.compile(r'[,\s]+')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+_CAPTION_NUM_RE = re.compile(r'(?:Figure|Fig\.|Table|Tab\.)\s*(\d+[a-z]?)', re.IGNORECASE)
 
 # Token消耗记录
 token_usage = {
@@ -47,92 +67,200 @@ token_usage = {
     'llm_tokens_output': 0
 }
 
+# PDF渲染进程池（CPU 密集的栅格化放到独立进程，OCR/LLM 等 I/O 仍在线程中）
+_render_pool = None
+_render_pool_lock = threading.Lock()
 
-def pdf_to_images(pdf_path: str, output_dir: str, dpi: int = None) -> List[str]:
-    """将PDF转换为图片，实时打印进度"""
-    try:
-        import fitz  # PyMuPDF
-    except ImportError:
-        print("错误: 请先安装 PyMuPDF: pip install PyMuPDF")
-        return []
 
+def _get_render_pool() -> ProcessPoolExecutor:
+    """获取PDF渲染进程池（惰性创建，spawn 方式启动，避免在多线程进程中 fork）"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            workers = concurrency_config.get('render_workers') or min(4, os.cpu_count() or 1)
+            _render_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _render_pool
+
+
+def _reset_render_pool():
+    """渲染进程异常退出后丢弃进程池，下次使用时重建"""
+    global _render_pool
+    with _render_pool_lock:
+        _render_pool = None
+
+
+# 可视化图片只供人工排查、后续流程不会读取：交给单独的写盘线程，OCR 线程无需等待整页 PNG 的绘制与编码
+# 队列有界，写盘跟不上时提交方阻塞，积压的页面图数量有上限
+_viz_queue = queue.Queue(maxsize=16)
+_viz_thread = None
+_viz_thread_lock = threading.Lock()
+
+
+def _viz_writer():
+    """后台线程：依次生成并保存可视化图片"""
+    while True:
+        page_image, ocr_items, vis_path = _viz_queue.get()
+        try:
+            visualize_ocr_result(page_image, ocr_items, vis_path)
+        except Exception as e:
+            print(f"   ⚠️  可视化生成失败 ({os.path.basename(vis_path)}) - {str(e)}")
+        finally:
+            _viz_queue.task_done()
+
+
+def _submit_visualization(page_image: Image.Image, ocr_items: List[Dict], vis_path: str):
+    """提交可视化任务（首次调用时启动写盘线程，进程退出前等待队列写完）"""
+    global _viz_thread
+    with _viz_thread_lock:
+        if _viz_thread is None:
+            _viz_thread = threading.Thread(target=_viz_writer, name='ocr-viz-writer', daemon=True)
+            _viz_thread.start()
+            atexit.register(_viz_queue.join)
+    _viz_queue.put((page_image, ocr_items, vis_path))
+
+
+def iter_pdf_pages(pdf_path: str, dpi: int = None, pdf_bytes: bytes = None, max_pages: int = None):
+    """
+    将PDF转换为每页的图片字节（不写临时文件），按页码顺序逐块产出 (页码索引, 图片字节)
+    页面按 render_chunk_pages 分块提交到渲染进程池并行栅格化，前面的分块一渲染完即可开始 OCR
+    """
     dpi = dpi or analysis_config.get('pdf_dpi', 200)
-    os.makedirs(output_dir, exist_ok=True)
+    total = pdf_render.count_pages(pdf_path, pdf_bytes)
+    if max_pages is not None:
+        total = min(total, max_pages)
+    chunk = max(1, analysis_config.get('render_chunk_pages', 4))
+    image_format = analysis_config.get('ocr_image_format', 'jpeg')
+    jpeg_quality = analysis_config.get('ocr_jpeg_quality', 85)
+    colorspace = analysis_config.get('pdf_colorspace', 'rgb')
+    # 下载阶段已把 PDF 写盘：渲染进程按路径自行打开，不必把整份 PDF 字节随每个分块重复序列化
+    chunk_bytes = None if os.path.exists(pdf_path) else pdf_bytes
+    chunks = [
+        (pdf_path, dpi, chunk_bytes, first, min(first + chunk, total), image_format, jpeg_quality, colorspace)
+        for first in range(0, total, chunk)
+    ]
 
-    # 尝试禁用MuPDF的警告输出（兼容不同版本）
     try:
-        fitz.set_messages_enabled(False)
-    except AttributeError:
-        pass  # 某些PyMuPDF版本不支持此方法
+        pool = _get_render_pool()
+        futures = [(pool.submit(pdf_render.render_pdf_pages, *args), args) for args in chunks]
+    except BrokenProcessPool as e:
+        print(f"   ⚠️  渲染进程异常，改为当前进程渲染: {e}")
+        _reset_render_pool()
+        for args in chunks:
+            yield from pdf_render.render_pdf_pages(*args)
+        return
+
+    # 按提交顺序取结果：后面的分块先渲染完也要等前面的分块，保证批量 OCR 拼接的是相邻页
+    for future, args in futures:
+        try:
+            pages = future.result()
+        except BrokenProcessPool as e:
+            print(f"   ⚠️  渲染进程异常，改为当前进程渲染: {e}")
+            _reset_render_pool()
+            pages = pdf_render.render_pdf_pages(*args)
+        yield from pages
 
-    doc = None
-    try:
-        doc = fitz.open(pdf_path)
-        total_pages = len(doc)
-        image_paths = []
-        failed_pages = []
-
-        for page_num in range(total_pages):
-            try:
-                page = doc[page_num]
-                mat = fitz.Matrix(dpi/72, dpi/72)
-                pix = page.get_pixmap(matrix=mat)
-                image_path = os.path.join(output_dir, f"page_{page_num+1:03d}.png")
-                pix.save(image_path)
-                image_paths.append(image_path)
-            except Exception as e:
-                failed_pages.append(page_num + 1)
-                print(f"   ⚠️  Page {page_num + 1} 转换失败: {str(e)[:50]}")
+
+def _ocr_pdf_pages(pdf_path: str, pdf_bytes: bytes, pdf_dpi: int, max_pages: int, ocr_dir: str,
+                   figures_dir: str, save_viz: bool, save_cropped: bool, ocr_workers: int):
+    """
+    渲染与 OCR 流水线：每渲染完一块页面就提交 OCR，不必等整篇 PDF 渲染结束
+
+    Returns:
+        (按页码排序的 OCR 结果, 全部关键图表, 渲染成功的页数)
+    """
+    ocr_results = []
+    all_key_figures = []
+    rendered = 0
+    batch_pages = max(1, ocr_config.get('batch_pages', 1))
+
+    # 限制已提交未完成的 OCR 任务数：渲染快于 OCR 时，不把整篇论文的页面图片都堆在队列里
+    in_flight = threading.BoundedSemaphore(max(1, ocr_workers) * 2)
+
+    with ThreadPoolExecutor(max_workers=ocr_workers) as executor:
+        futures = []
+
+        def submit(fn, args):
+            in_flight.acquire()
+            future = executor.submit(fn, args)
+            future.add_done_callback(lambda _: in_flight.release())
+            futures.append(future)
+
+        batch = []
+        for page_idx, image_bytes in iter_pdf_pages(pdf_path, pdf_dpi, pdf_bytes, max_pages):
+            rendered += 1
+            if batch_pages == 1:
+                submit(process_single_page, (page_idx, image_bytes, ocr_dir, figures_dir, save_viz, save_cropped))
                 continue
+            batch.append((page_idx, image_bytes))
+            if len(batch) >= batch_pages:
+                submit(process_page_batch, (batch, ocr_dir, figures_dir, save_viz, save_cropped))
+                batch = []
+        if batch:
+            submit(process_page_batch, (batch, ocr_dir, figures_dir, save_viz, save_cropped))
+        for future in as_completed(futures):
+            result = future.result()
+            for page_result in (result if isinstance(result, list) else [result]):
+                if page_result and isinstance(page_result, dict):
+                    ocr_results.append(page_result)
+                    all_key_figures.extend(page_result.get('figures', []))
+
+    ocr_results.sort(key=lambda x: x['page'])
+    return ocr_results, all_key_figures, rendered
+
+
+def _ocr_upload_bytes(image_bytes: bytes) -> bytes:
+    """
+    按 deepseek_ocr.max_side 缩小上传给 OCR 的页面图片（图片 token 与上传量随像素数增长）
+    只影响发送给模型的图片；OCR 坐标按 0-1000 归一化，可视化与图表裁剪仍使用原分辨率页面
+    """
+    max_side = ocr_config.get('max_side', 0)
+    if not max_side:
+        return image_bytes
+    img = Image.open(io.BytesIO(image_bytes))  # 仅解析文件头即可拿到尺寸
+    if max(img.size) <= max_side:
+        return image_bytes
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=analysis_config.get('ocr_jpeg_quality', 85))
+    return buf.getvalue()
+
+
+def _ocr_image_part(image_bytes: bytes) -> Dict:
+    """把页面图片编码为 image_url 消息片段（按文件头识别 JPEG/PNG）"""
+    base64_image = base64.b64encode(image_bytes).decode('ascii')
+    mime_type = 'image/jpeg' if image_bytes[:2] == b'\xff\xd8' else 'image/png'
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{mime_type};base64,{base64_image}",
+            "detail": ocr_config.get('detail', 'auto')
+        }
+    }
 
-        if failed_pages:
-            print(f"   ⚠️  PDF转换: {len(failed_pages)}/{total_pages} 页失败 (页码: {failed_pages[:5]}{'...' if len(failed_pages) > 5 else ''})")
 
-        return image_paths
-    except Exception as e:
-        print(f"   ❌ PDF打开失败: {str(e)[:100]}")
-        return []
-    finally:
-        if doc:
-            try:
-                doc.close()
-            except:
-                pass
+def _ocr_cache_key(ocr_model: str, image_bytes: bytes) -> str:
+    """OCR 缓存键：模型 + 提示词 + 页面图片内容哈希"""
+    return cache.make_key(ocr_model, OCR_PROMPT, hashlib.sha256(image_bytes).hexdigest())
 
 
-def call_deepseek_ocr(image_path: str) -> Tuple[str, Dict]:
-    """调用DeepSeek-OCR模型分析图片"""
+def _request_ocr(content: List[Dict], ocr_model: str) -> Tuple[str, Dict]:
+    """发送一次 OCR 请求（带重试与 token 统计），最终失败返回 (None, {})"""
     global token_usage
-    
+
     timeout = ocr_config.get('timeout', 120)
     max_retries = ocr_config.get('max_retries', 3)
     retry_delay = ocr_config.get('retry_delay', 5)
-    
-    with open(image_path, "rb") as image_file:
-        base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-    
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{base64_image}"},
-                    "detail": "high"
-                },
-                {
-                    "type": "text",
-                    "text": "<|grounding|>Convert the document to markdown."
-                }
-            ]
-        }
-    ]
-    
+    messages = [{"role": "user", "content": content}]
+
     for attempt in range(max_retries):
         try:
-            ocr_model = ocr_config.get('model', 'deepseek-ocr')
             start_time = time.time()
-            response = ocr_client.chat.completions.create(
+            response = get_ocr_client().chat.completions.create(
                 model=ocr_model,
                 messages=messages,
                 temperature=0.1,
@@ -153,21 +281,98 @@ def call_deepseek_ocr(image_path: str) -> Tuple[str, Dict]:
         except Exception as e:
             error_msg = str(e)
             print(f"⚠️  OCR调用失败 (第{attempt + 1}次尝试): {error_msg}")
-            if attempt < max_retries - 1:
-                print(f"   等待 {retry_delay} 秒后重试...")
-                time.sleep(retry_delay)
+            delay = utils.backoff_delay(e, attempt, retry_delay)
+            if attempt < max_retries - 1 and delay is not None:
+                print(f"   等待 {delay:.1f} 秒后重试...")
+                time.sleep(delay)
             else:
                 print(f"❌ OCR调用最终失败，已重试 {max_retries} 次")
                 return None, {}
 
 
+def call_deepseek_ocr(image_bytes: bytes) -> Tuple[str, Dict]:
+    """调用DeepSeek-OCR模型分析图片（直接使用内存中的图片字节）"""
+    response_cache = llm_agent.get_response_cache()
+    ocr_model = ocr_config.get('model', 'deepseek-ocr')
+    image_bytes = _ocr_upload_bytes(image_bytes)
+
+    # 同一页面图片（重跑、断点续跑、同一 PDF 出现在多个分类）直接复用历史 OCR 结果
+    cache_key = _ocr_cache_key(ocr_model, image_bytes)
+    cached = response_cache.get('ocr_page', cache_key) if response_cache else None
+    if cached is not None:
+        token_usage['ocr_cache_hits'] = token_usage.get('ocr_cache_hits', 0) + 1
+        return cached, {'model': ocr_model, 'elapsed': 0, 'tokens': 0, 'cached': True}
+
+    content, token_info = _request_ocr(
+        [_ocr_image_part(image_bytes), {"type": "text", "text": OCR_PROMPT}],
+        ocr_model
+    )
+    if response_cache and content:
+        response_cache.set('ocr_page', cache_key, content)
+    return content, token_info
+
+
+def call_deepseek_ocr_batch(images: List[bytes]) -> List[str]:
+    """
+    一次请求识别多页（deepseek_ocr.batch_pages > 1 时使用），返回与 images 一一对应的 OCR 文本
+    已缓存的页面不再发送；返回的分页数与请求页数不一致时，对这些页面逐页重新识别
+    """
+    response_cache = llm_agent.get_response_cache()
+    ocr_model = ocr_config.get('model', 'deepseek-ocr')
+    images = [_ocr_upload_bytes(image_bytes) for image_bytes in images]
+    keys = [_ocr_cache_key(ocr_model, image_bytes) for image_bytes in images]
+    texts = [response_cache.get('ocr_page', key) if response_cache else None for key in keys]
+    hits = sum(text is not None for text in texts)
+    if hits:
+        token_usage['ocr_cache_hits'] = token_usage.get('ocr_cache_hits', 0) + hits
+
+    missing = [i for i, text in enumerate(texts) if text is None]
+    if len(missing) > 1:
+        prompt = (
+            f"{OCR_PROMPT} There are {len(missing)} pages. Convert each page in order, "
+            f"and separate consecutive pages with a line containing only {OCR_PAGE_SEPARATOR}."
+        )
+        content, _ = _request_ocr(
+            [_ocr_image_part(images[i]) for i in missing] + [{"type": "text", "text": prompt}],
+            ocr_model
+        )
+        parts = [part.strip() for part in content.split(OCR_PAGE_SEPARATOR)] if content else []
+        if len(parts) == len(missing) and all(parts):
+            for i, part in zip(missing, parts):
+                texts[i] = part
+                if response_cache:
+                    response_cache.set('ocr_page', keys[i], part)
+            missing = []
+        else:
+            print(f"   ⚠️  多页OCR结果无法按页拆分，改为逐页识别 ({len(missing)} 页)")
+
+    for i in missing:
+        texts[i], _ = call_deepseek_ocr(images[i])
+    return texts
+
+
 def process_single_page(args):
     """处理单页（用于并发）"""
-    page_idx, image_path, ocr_dir, figures_dir, save_viz, save_cropped = args
-    page_num = page_idx + 1
+    page_idx, image_bytes, ocr_dir, figures_dir, save_viz, save_cropped = args
     
     # OCR识别
-    ocr_text, ocr_token_info = call_deepseek_ocr(image_path)
+    ocr_text, ocr_token_info = call_deepseek_ocr(image_bytes)
+    return _finish_page(page_idx, image_bytes, ocr_text, ocr_dir, figures_dir, save_viz, save_cropped)
+
+
+def process_page_batch(args):
+    """一次 OCR 请求处理多页（用于并发），返回各页结果列表"""
+    pages, ocr_dir, figures_dir, save_viz, save_cropped = args
+    ocr_texts = call_deepseek_ocr_batch([image_bytes for _, image_bytes in pages])
+    return [
+        _finish_page(page_idx, image_bytes, ocr_text, ocr_dir, figures_dir, save_viz, save_cropped)
+        for (page_idx, image_bytes), ocr_text in zip(pages, ocr_texts)
+    ]
+
+
+def _finish_page(page_idx, image_bytes, ocr_text, ocr_dir, figures_dir, save_viz, save_cropped):
+    """解析单页 OCR 结果，保存文本、可视化与裁剪图表"""
+    page_num = page_idx + 1
     if not ocr_text:
         print(f"   📄 Page {page_num}: OCR识别失败，跳过该页")
         return None
@@ -183,21 +388,23 @@ def process_single_page(args):
     with open(ocr_txt_path, 'w', encoding='utf-8') as f:
         f.write(ocr_text)
     
-    # 可视化
-    if save_viz:
-        try:
-            vis_path = os.path.join(ocr_dir, f"page_{page_num:03d}_vis.png")
-            visualize_ocr_result(image_path, ocr_items, vis_path)
-        except Exception as e:
-            print(f"   📄 Page {page_num}: 可视化生成失败 - {str(e)}")
+    # 可视化与图表裁剪共用同一张解码后的页面图
+    page_image = None
+    if save_viz or save_cropped:
+        page_image = Image.open(io.BytesIO(image_bytes))
+        page_image.load()
 
     # 提取关键图表
     page_figures = []
     if save_cropped:
         try:
-            page_figures = extract_key_figures(ocr_items, image_path, figures_dir, page_num)
+            page_figures = extract_key_figures(ocr_items, page_image, figures_dir, page_num)
         except Exception as e:
             print(f"   📄 Page {page_num}: 图表提取失败 - {str(e)}")
+
+    # 可视化（裁剪完成后再交给后台线程，之后本线程不再访问 page_image）
+    if save_viz:
+        _submit_visualization(page_image, ocr_items, os.path.join(ocr_dir, f"page_{page_num:03d}_vis.png"))
     
     return {
         'page': page_num,
@@ -209,40 +416,26 @@ def process_single_page(args):
 
 def parse_ocr_response(content: str) -> List[Dict[str, Any]]:
     """解析OCR响应，提取各个区域"""
+    # split 带捕获组时返回 [标签前文本, type, rect, 区域文本, type, rect, 区域文本, ...]，
+    # 每个区域的文本就是到下一个标签为止的内容，无需逐个构造 Match 对象再切片
+    parts = _OCR_TAG_RE.split(content)
     items = []
-    tag_pattern = re.compile(r'(?P<type>\w+)\[\[(?P<rect>[\d,\s,]+)\]\]')
-    matches = list(tag_pattern.finditer(content))
-    
-    for i, match in enumerate(matches):
-        data = match.groupdict()
-        label = data['type']
-        rect_str = data['rect']
-        
+    for label, rect_str, text in zip(parts[1::3], parts[2::3], parts[3::3]):
         try:
-            bbox = [int(x) for x in re.split(r'[,\s]+', rect_str.strip()) if x]
+            bbox = [int(x) for x in _BBOX_SPLIT_RE.split(rect_str.strip()) if x]
         except ValueError:
             continue
-            
-        start_idx = match.end()
-        if i < len(matches) - 1:
-            end_idx = matches[i+1].start()
-        else:
-            end_idx = len(content)
-            
-        text_content = content[start_idx:end_idx].strip()
-        
         items.append({
             "type": label,
             "bbox": bbox,
-            "text": text_content
+            "text": text.strip()
         })
     
     return items
 
 
-def crop_region(image_path: str, bbox: List[int], output_path: str):
-    """从图片中裁剪指定区域"""
-    img = Image.open(image_path)
+def crop_region(img: Image.Image, bbox: List[int], output_path: str):
+    """从页面图中裁剪指定区域"""
     width, height = img.size
     
     x1 = int(bbox[0] / 1000 * width)
@@ -258,65 +451,75 @@ def crop_region(image_path: str, bbox: List[int], output_path: str):
         cropped.save(output_path)
 
 
-def visualize_ocr_result(image_path: str, ocr_items: List[Dict], output_path: str):
-    """绘制OCR可视化结果 - 只在原图上画框和标签"""
-    img = Image.open(image_path).convert("RGB")
-    width, height = img.size
-    draw = ImageDraw.Draw(img)
-    
+@functools.lru_cache(maxsize=8)
+def _get_viz_font(font_size: int):
+    """可视化标签字体（按字号缓存：同一 DPI 下每页字号相同，字体文件只解析一次）"""
     try:
-        font_size = max(12, int(width / 80))
-        font = ImageFont.truetype("/System/Library/Fonts/Supplemental/Arial.ttf", size=font_size)
+        return ImageFont.truetype("/System/Library/Fonts/Supplemental/Arial.ttf", size=font_size)
     except IOError:
-        font = ImageFont.load_default()
-    
-    color_map = {
-        "title": (255, 0, 0),
-        "text": (0, 0, 0),
-        "header": (0, 128, 0),
-        "figure": (0, 0, 255),
-        "image": (0, 0, 255),
-        "image_caption": (255, 165, 0),
-        "caption": (255, 165, 0),
-        "table": (128, 0, 128),
-        "table_caption": (255, 105, 180),
-        "sub_title": (0, 128, 128),
-        "author": (128, 128, 0),
-        "abstract": (70, 130, 180),
-        "reference": (105, 105, 105),
-        "formula": (255, 20, 147),
-        "code": (0, 100, 0),
-    }
+        return ImageFont.load_default()
+
+
+# OCR 区域类型对应的可视化颜色
+_VIZ_COLOR_MAP = {
+    "title": (255, 0, 0),
+    "text": (0, 0, 0),
+    "header": (0, 128, 0),
+    "figure": (0, 0, 255),
+    "image": (0, 0, 255),
+    "image_caption": (255, 165, 0),
+    "caption": (255, 165, 0),
+    "table": (128, 0, 128),
+    "table_caption": (255, 105, 180),
+    "sub_title": (0, 128, 128),
+    "author": (128, 128, 0),
+    "abstract": (70, 130, 180),
+    "reference": (105, 105, 105),
+    "formula": (255, 20, 147),
+    "code": (0, 100, 0),
+}
+
+
+def visualize_ocr_result(page_image: Image.Image, ocr_items: List[Dict], output_path: str):
+    """绘制OCR可视化结果 - 在页面图的副本上画框和标签"""
+    img = page_image.convert("RGB")
+    width, height = img.size
+    draw = ImageDraw.Draw(img)
+    font_size = max(12, int(width / 80))
+    font = _get_viz_font(font_size)
+    # bbox 为 0-1000 的归一化坐标
+    sx, sy = width / 1000, height / 1000
+    # 标签种类有限，文字宽度按标签缓存
+    label_widths = {}
     
     for item in ocr_items:
         bbox = item['bbox']
         label = item['type']
         
-        if len(bbox) == 4:
-            x1 = int(bbox[0] / 1000 * width)
-            y1 = int(bbox[1] / 1000 * height)
-            x2 = int(bbox[2] / 1000 * width)
-            y2 = int(bbox[3] / 1000 * height)
-        else:
+        if len(bbox) != 4:
             continue
+        x1 = max(0, int(bbox[0] * sx))
+        y1 = max(0, int(bbox[1] * sy))
+        x2 = min(width, int(bbox[2] * sx))
+        y2 = min(height, int(bbox[3] * sy))
         
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(width, x2), min(height, y2)
-        
-        color = color_map.get(label, (100, 100, 100))
+        color = _VIZ_COLOR_MAP.get(label, (100, 100, 100))
         
         draw.rectangle([x1, y1, x2, y2], outline=color, width=2)
-        text_w = font.getlength(label)
+        text_w = label_widths.get(label)
+        if text_w is None:
+            text_w = label_widths[label] = font.getlength(label)
         draw.rectangle([x1, y1 - font_size - 2, x1 + text_w + 4, y1], fill=color)
         draw.text((x1 + 2, y1 - font_size), label, fill=(255, 255, 255), font=font)
     
-    img.save(output_path)
+    # 调试用的可视化图，低压缩级别即可，PNG 编码耗时大幅减少
+    img.save(output_path, compress_level=1)
 
 
-def extract_key_figures(ocr_items: List[Dict], image_path: str, 
+def extract_key_figures(ocr_items: List[Dict], page_image: Image.Image,
                         figures_dir: str, page_num: int) -> List[Dict]:
     """提取关键图表"""
-    os.makedirs(figures_dir, exist_ok=True)
+    utils.ensure_dir(figures_dir)
     
     key_figures = []
     
@@ -333,13 +536,12 @@ def extract_key_figures(ocr_items: List[Dict], image_path: str,
                 break
         
         # 清理caption中的HTML标签
-        import re
-        caption = re.sub(r'<[^>]+>', '', caption)
-        caption = re.sub(r'\s+', ' ', caption).strip()
+        caption = _HTML_TAG_RE.sub('', caption)
+        caption = _WHITESPACE_RE.sub(' ', caption).strip()
         
         ext = 'fig' if label in ['image', 'figure'] else 'table'
         crop_path = os.path.join(figures_dir, f"{ext}_p{page_num:03d}_{i+1:02d}.png")
-        crop_region(image_path, item['bbox'], crop_path)
+        crop_region(page_image, item['bbox'], crop_path)
         
         key_figures.append({
             'type': label,
@@ -354,33 +556,42 @@ def extract_key_figures(ocr_items: List[Dict], image_path: str,
     return key_figures
 
 
-def analyze_paper_content(ocr_results: List[Dict]) -> Tuple[Dict, Dict]:
-    """使用LLM分析论文OCR内容"""
-    global token_usage
-    
-    timeout = openai_config.get('timeout', 60)
-    max_retries = openai_config.get('max_retries', 3)
-    retry_delay = openai_config.get('retry_delay', 5)
-    max_length = analysis_config.get('max_ocr_text_length', 12000)
-    
-    # 合并文本
-    all_text = ""
+# 对内容分析几乎没有帮助的区域类型：参考文献、页码直接丢弃，页眉页脚只保留首次出现的内容
+_SKIP_ITEM_TYPES = frozenset(('reference', 'page_number'))
+_DEDUP_ITEM_TYPES = frozenset(('header', 'footer'))
+# 单个区域的最大字符数，避免个别超长区域（如整页公式/表格）挤占截断预算
+_MAX_ITEM_CHARS = 1000
+
+
+def _build_analysis_text(ocr_results: List[Dict]) -> str:
+    """把各页 OCR 区域拼成分析 Prompt 的论文内容：去掉无用区域、合并空白，省下的预算留给正文"""
+    parts = []
+    seen = set()
     for page in ocr_results:
-        page_num = page['page']
-        all_text += f"\n\n=== Page {page_num} ===\n\n"
+        parts.append(f"\n\n=== Page {page['page']} ===\n\n")
         for item in page['items']:
-            all_text += f"[{item['type']}] {item['text']}\n"
-    
-    if len(all_text) > max_length:
-        all_text = all_text[:max_length] + "\n... (内容已截断)"
-    
-    prompt = f"""你是一个专业的学术论文分析助手。请仔细分析以下论文的OCR内容，提取关键信息。
+            item_type = item['type']
+            if item_type in _SKIP_ITEM_TYPES:
+                continue
+            text = _WHITESPACE_RE.sub(' ', item['text']).strip()
+            if not text:
+                continue
+            if item_type in _DEDUP_ITEM_TYPES:
+                if text in seen:
+                    continue
+                seen.add(text)
+            if len(text) > _MAX_ITEM_CHARS:
+                text = text[:_MAX_ITEM_CHARS] + '...'
+            parts.append(f"[{item_type}] {text}\n")
+    return ''.join(parts)
 
-论文内容:
-{all_text}
+
+# 内容分析的固定指令放在 Prompt 开头、论文内容放在末尾：所有论文共享同一前缀，
+# 便于命中服务端的自动前缀缓存（命中量记录在 token_usage['llm_tokens_cached']）
+ANALYSIS_PROMPT = """你是一个专业的学术论文分析助手。请仔细分析文末给出的论文OCR内容，提取关键信息。
 
 请提取以下信息并以JSON格式返回:
-{{
+{
     "title": "论文标题",
     "title_cn": "论文中文标题或翻译",
     "authors": ["作者1", "作者2"],
@@ -402,7 +613,7 @@ def analyze_paper_content(ocr_results: List[Dict]) -> Tuple[Dict, Dict]:
     "pros": ["论文亮点1", "论文亮点2"],
     "cons": ["局限性1", "局限性2"],
     "inspirations": ["对未来研究或实践的启发1", "启发2"]
-}}
+}
 
 注意：
 1. 返回必须是有效的JSON格式
@@ -413,13 +624,50 @@ def analyze_paper_content(ocr_results: List[Dict]) -> Tuple[Dict, Dict]:
 6. 对图表的描述要详细，说明其用途和展示的内容
 7. pros, cons, inspirations 必须根据论文内容给出具体的分析，不要留空，且必须为中文。
 """
+
+
+def analyze_paper_content(ocr_results: List[Dict]) -> Tuple[Dict, Dict]:
+    """使用LLM分析论文OCR内容"""
+    global token_usage
+    response_cache = llm_agent.get_response_cache()
+    
+    timeout = openai_config.get('timeout', 60)
+    max_retries = openai_config.get('max_retries', 3)
+    retry_delay = openai_config.get('retry_delay', 5)
+    max_length = analysis_config.get('max_ocr_text_length', 12000)
+    max_tokens = analysis_config.get('max_ocr_tokens')
+    
+    all_text = _build_analysis_text(ocr_results)
+    
+    # 配置了 token 上限时按模型分词器精确截断，否则沿用字符数上限
+    if max_tokens:
+        all_text = utils.truncate_tokens(all_text, max_tokens, config['openai']['model'], suffix="\n... (内容已截断)")
+    elif len(all_text) > max_length:
+        all_text = all_text[:max_length] + "\n... (内容已截断)"
     
+    prompt = f"{ANALYSIS_PROMPT}\n论文内容:\n{all_text}\n"
+    
+    # 同一论文重跑或 OCR 文本仅有空白/标点差异时，按归一化后的 Prompt 复用历史分析结果
+    normalized_prompt = cache.normalize_text(prompt)
+    cached, cached_model = llm_agent.cache_lookup(
+        'paper_analysis', lambda model: cache.make_key(model, normalized_prompt)
+    )
+    if cached is not None:
+        token_usage['llm_cache_hits'] = token_usage.get('llm_cache_hits', 0) + 1
+        return cached, {
+            'model': cached_model,
+            'elapsed': 0,
+            'tokens_input': 0,
+            'tokens_output': 0,
+            'cached': True
+        }
+
+    messages = [{"role": "user", "content": prompt}]
     for attempt in range(max_retries):
         try:
             start_time = time.time()
-            response = client.chat.completions.create(
-                model=config['openai']['model'],
-                messages=[{"role": "user", "content": prompt}],
+            response, model = llm_agent.chat_completion(
+                messages=messages,
                 response_format={"type": "json_object"},
                 temperature=0.3,
                 timeout=timeout
@@ -428,22 +676,48 @@ def analyze_paper_content(ocr_results: List[Dict]) -> Tuple[Dict, Dict]:
             
             token_usage['llm_calls'] += 1
             usage = response.usage
+            # 命中服务端自动前缀缓存的输入 tokens（接口未返回时记为 0）
+            cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', 0) or 0
             if usage:
                 token_usage['llm_tokens_input'] += usage.prompt_tokens
                 token_usage['llm_tokens_output'] += usage.completion_tokens
+                token_usage['llm_tokens_cached'] = token_usage.get('llm_tokens_cached', 0) + cached_tokens
             
-            result = json.loads(response.choices[0].message.content)
+            result = utils.json_loads(response.choices[0].message.content)
+            if response_cache and result:
+                response_cache.set('paper_analysis', cache.make_key(model, normalized_prompt), result)
             token_info = {
-                'model': config['openai']['model'],
+                'model': model,
                 'elapsed': elapsed,
                 'tokens_input': usage.prompt_tokens if usage else 0,
-                'tokens_output': usage.completion_tokens if usage else 0
+                'tokens_output': usage.completion_tokens if usage else 0,
+                'tokens_cached': cached_tokens
             }
             return result, token_info
         except Exception as e:
-            if attempt == max_retries - 1:
+            delay = utils.backoff_delay(e, attempt, retry_delay)
+            if attempt == max_retries - 1 or delay is None:
                 return {}, {}
-            time.sleep(retry_delay)
+            time.sleep(delay)
+
+
+# 图表分类关键词
+# 架构图关键词
+ARCH_KEYWORDS = ('arch', 'framework', 'overview', 'model', 'structure', 'pipeline', 'system', 'design')
+# 结果图关键词
+RESULT_KEYWORDS = ('result', 'performance', 'comparison', 'ablation', 'accuracy', 'loss', 'curve', 'plot')
+
+
+def _figure_category(fig: Dict) -> str:
+    """按类型与 caption 关键词给图表分类：table / arch / result / other"""
+    if fig['type'] == 'table':
+        return 'table'
+    caption = fig.get('caption', '').lower()
+    if any(kw in caption for kw in ARCH_KEYWORDS):
+        return 'arch'
+    if any(kw in caption for kw in RESULT_KEYWORDS):
+        return 'result'
+    return 'other'
 
 
 def select_key_figures_for_report(all_figures: List[Dict], analysis: Dict) -> List[Dict]:
@@ -459,23 +733,16 @@ def select_key_figures_for_report(all_figures: List[Dict], analysis: Dict) -> Li
     result_figures = []
     tables = []
     
+    # 分类结果记在 fig['category']，生成笔记时直接使用，不再重复匹配关键词
     for fig in all_figures:
-        caption = fig.get('caption', '').lower()
-        fig_type = fig['type']
-        
-        # 架构图关键词
-        arch_keywords = ['arch', 'framework', 'overview', 'model', 'structure', 'pipeline', 'system', 'design']
-        # 结果图关键词
-        result_keywords = ['result', 'performance', 'comparison', 'ablation', 'accuracy', 'loss', 'curve', 'plot']
+        category = fig['category'] = _figure_category(fig)
         
-        if fig_type == 'table':
+        if category == 'table':
             tables.append(fig)
-        elif any(kw in caption for kw in arch_keywords):
+        elif category == 'arch':
             arch_figures.append(fig)
-        elif any(kw in caption for kw in result_keywords):
-            result_figures.append(fig)
         else:
-            # 其他图片，归入结果图
+            # 结果图与其他图片都归入结果图
             result_figures.append(fig)
     
     # 选择：1-2张架构图，1-2张结果图，1张表格
@@ -484,8 +751,9 @@ def select_key_figures_for_report(all_figures: List[Dict], analysis: Dict) -> Li
     selected.extend(result_figures[:2])
     selected.extend(tables[:1])
     
-    # 如果还不够，补充其他图
-    remaining = [f for f in all_figures if f not in selected]
+    # 如果还不够，补充其他图（按对象 id 判断是否已选，避免逐个比较 dict）
+    selected_ids = {id(f) for f in selected}
+    remaining = [f for f in all_figures if id(f) not in selected_ids]
     selected.extend(remaining[:max_figures - len(selected)])
     
     # 添加LLM分析描述 - 按顺序匹配
@@ -502,9 +770,8 @@ def get_clean_caption(caption: str, fig_type: str) -> str:
     if not caption:
         return "原文图" if fig_type != 'table' else "原文表"
     
-    import re
     # 匹配 Figure 1, Fig. 1, Table 1 等
-    match = re.search(r'(?:Figure|Fig\.|Table|Tab\.)\s*(\d+[a-z]?)', caption, re.IGNORECASE)
+    match = _CAPTION_NUM_RE.search(caption)
     if match:
         num = match.group(1)
         prefix = "原文表" if "tab" in caption.lower() else "原文图"
@@ -518,39 +785,40 @@ def generate_paper_note(paper_info: Dict, analysis: Dict, selected_figures: List
     title = analysis.get('title', paper_info['title'])
     title_cn = analysis.get('title_cn', '')
     
-    md_content = f"# {title}\n\n"
+    # 分段收集后一次拼接，避免反复 += 生成中间字符串
+    parts = [f"# {title}\n\n"]
+    add = parts.append
     
     if title_cn:
-        md_content += f"**中文标题**: {title_cn}\n\n"
+        add(f"**中文标题**: {title_cn}\n\n")
     
-    md_content += f"**作者**: {', '.join(analysis.get('authors', paper_info['authors']))}\n\n"
-    md_content += f"**来源**: arXiv | **日期**: {paper_info.get('date', '')}\n\n"
-    md_content += "---\n\n"
+    add(f"**作者**: {', '.join(analysis.get('authors', paper_info['authors']))}\n\n")
+    add(f"**来源**: arXiv | **日期**: {paper_info.get('date', '')}\n\n")
+    add("---\n\n")
     
-    md_content += "## 核心问题\n\n"
-    md_content += f"{analysis.get('core_problem', '未提取')}\n\n"
+    add("## 核心问题\n\n")
+    add(f"{analysis.get('core_problem', '未提取')}\n\n")
     
-    md_content += "## 核心贡献\n\n"
+    add("## 核心贡献\n\n")
     contribution = analysis.get('core_contribution', '')
     if isinstance(contribution, list):
         for item in contribution:
-            md_content += f"- {item}\n"
+            add(f"- {item}\n")
     else:
-        md_content += f"{contribution}\n"
-    md_content += "\n"
+        add(f"{contribution}\n")
+    add("\n")
     
-    md_content += "## 方法概述\n\n"
+    add("## 方法概述\n\n")
     method_summary = analysis.get('method_summary', '未提取')
-    md_content += f"{method_summary}\n\n"
+    add(f"{method_summary}\n\n")
     
     # 记录已使用的图片，防止重复
     used_figures = set()
     
     # 融入架构图（在方法概述后）
-    arch_figures = [f for f in selected_figures if f['type'] in ['image', 'figure'] and 
-                   any(kw in f.get('caption', '').lower() for kw in ['arch', 'framework', 'overview', 'model', 'structure', 'pipeline', 'system'])]
+    arch_figures = [f for f in selected_figures if f.get('category') == 'arch']
     if arch_figures:
-        md_content += "**架构图**\n\n"
+        add("**架构图**\n\n")
         for fig in arch_figures[:2]:
             abs_path = os.path.abspath(fig['crop_path'])
             if abs_path in used_figures:
@@ -560,23 +828,21 @@ def generate_paper_note(paper_info: Dict, analysis: Dict, selected_figures: List
             clean_cap = get_clean_caption(fig.get('caption', ''), fig['type'])
             
             if desc:
-                md_content += f"{desc}\n\n"
-            md_content += f"![{clean_cap}](file://{abs_path})\n\n"
-            md_content += f"*{clean_cap}*\n\n"
+                add(f"{desc}\n\n")
+            add(f"![{clean_cap}](file://{abs_path})\n\n")
+            add(f"*{clean_cap}*\n\n")
             used_figures.add(abs_path)
     
-    md_content += "---\n\n"
+    add("---\n\n")
     
-    md_content += "## 实验结果\n\n"
-    md_content += f"{analysis.get('key_results', '未提取')}\n\n"
+    add("## 实验结果\n\n")
+    add(f"{analysis.get('key_results', '未提取')}\n\n")
     
     # 融入结果图和表格
-    result_figures = [f for f in selected_figures if 
-                     (f['type'] in ['image', 'figure'] and any(kw in f.get('caption', '').lower() for kw in ['result', 'performance', 'comparison', 'ablation', 'accuracy', 'loss', 'curve', 'plot'])) or
-                     f['type'] == 'table']
+    result_figures = [f for f in selected_figures if f.get('category') in ('result', 'table')]
     
     if result_figures:
-        md_content += "**实验数据**\n\n"
+        add("**实验数据**\n\n")
         for fig in result_figures[:3]:
             abs_path = os.path.abspath(fig['crop_path'])
             if abs_path in used_figures:
@@ -586,63 +852,65 @@ def generate_paper_note(paper_info: Dict, analysis: Dict, selected_figures: List
             clean_cap = get_clean_caption(fig.get('caption', ''), fig['type'])
             
             if desc:
-                md_content += f"{desc}\n\n"
+                add(f"{desc}\n\n")
             
-            md_content += f"![{clean_cap}](file://{abs_path})\n\n"
-            md_content += f"*{clean_cap}*\n\n"
+            add(f"![{clean_cap}](file://{abs_path})\n\n")
+            add(f"*{clean_cap}*\n\n")
             used_figures.add(abs_path)
     
-    md_content += "---\n\n"
-    md_content += "## 结论\n\n"
-    md_content += f"{analysis.get('conclusion', '未提取')}\n\n"
+    add("---\n\n")
+    add("## 结论\n\n")
+    add(f"{analysis.get('conclusion', '未提取')}\n\n")
     
-    md_content += "---\n\n"
-    md_content += "## 个人思考\n\n"
-    md_content += "### 亮点\n\n"
+    add("---\n\n")
+    add("## 个人思考\n\n")
+    add("### 亮点\n\n")
     pros = analysis.get('pros', [])
     if isinstance(pros, list):
         for item in pros:
-            md_content += f"- {item}\n"
+            add(f"- {item}\n")
     else:
-        md_content += f"{pros}\n"
-    md_content += "\n"
+        add(f"{pros}\n")
+    add("\n")
     
-    md_content += "### 局限性\n\n"
+    add("### 局限性\n\n")
     cons = analysis.get('cons', [])
     if isinstance(cons, list):
         for item in cons:
-            md_content += f"- {item}\n"
+            add(f"- {item}\n")
     else:
-        md_content += f"{cons}\n"
-    md_content += "\n"
+        add(f"{cons}\n")
+    add("\n")
     
-    md_content += "### 启发\n\n"
+    add("### 启发\n\n")
     inspirations = analysis.get('inspirations', [])
     if isinstance(inspirations, list):
         for item in inspirations:
-            md_content += f"- {item}\n"
+            add(f"- {item}\n")
     else:
-        md_content += f"{inspirations}\n"
-    md_content += "\n"
-    
-    md_content += "---\n\n"
-    md_content += "## 处理记录\n\n"
-    md_content += f"- OCR模型: {token_info.get('ocr_model', 'unknown')}\n"
-    md_content += f"- OCR调用次数: {token_info.get('ocr_calls', 0)}\n"
-    md_content += f"- OCR总tokens: {token_info.get('ocr_tokens', 0)}\n"
-    md_content += f"- LLM模型: {token_info.get('llm_model', 'unknown')}\n"
-    md_content += f"- LLM调用次数: {token_info.get('llm_calls', 0)}\n"
-    md_content += f"- LLM输入tokens: {token_info.get('llm_tokens_input', 0)}\n"
-    md_content += f"- LLM输出tokens: {token_info.get('llm_tokens_output', 0)}\n"
-    md_content += f"- 处理时间: {token_info.get('total_time', 0):.2f}秒\n"
+        add(f"{inspirations}\n")
+    add("\n")
+    
+    add("---\n\n")
+    add("## 处理记录\n\n")
+    add(f"- OCR模型: {token_info.get('ocr_model', 'unknown')}\n")
+    add(f"- OCR调用次数: {token_info.get('ocr_calls', 0)}\n")
+    add(f"- OCR总tokens: {token_info.get('ocr_tokens', 0)}\n")
+    add(f"- LLM模型: {token_info.get('llm_model', 'unknown')}\n")
+    add(f"- LLM调用次数: {token_info.get('llm_calls', 0)}\n")
+    add(f"- LLM输入tokens: {token_info.get('llm_tokens_input', 0)}\n")
+    add(f"- LLM输出tokens: {token_info.get('llm_tokens_output', 0)}\n")
+    add(f"- LLM缓存命中tokens: {token_info.get('llm_tokens_cached', 0)}\n")
+    add(f"- 处理时间: {token_info.get('total_time', 0):.2f}秒\n")
     
+    md_content = ''.join(parts)
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(md_content)
     
     return md_content
 
 
-def analyze_paper_deep(pdf_path: str, paper_info: Dict, category_dir: str) -> Dict[str, Any]:
+def analyze_paper_deep(pdf_path: str, paper_info: Dict, category_dir: str, pdf_bytes: bytes = None) -> Dict[str, Any]:
     """
     对论文进行深度分析的主函数 - 支持并发OCR
     
@@ -683,44 +951,19 @@ def analyze_paper_deep(pdf_path: str, paper_info: Dict, category_dir: str) -> Di
     ocr_dir = os.path.join(paper_dir, "ocr")
     figures_dir = os.path.join(paper_dir, "figures")
     
-    os.makedirs(ocr_dir, exist_ok=True)
-    os.makedirs(figures_dir, exist_ok=True)
+    utils.ensure_dir(ocr_dir)
+    utils.ensure_dir(figures_dir)
     
-    # 1. PDF转图片（临时目录）
-    import tempfile
+    # 1-2. PDF转图片（仅在内存中，超出 max_pages 的页面不渲染）+ 并发OCR分析
     print(f"🔬 深度分析: {paper_name}")
-    with tempfile.TemporaryDirectory() as temp_dir:
-        print(f"   📑 正在转换PDF为图片 (DPI={pdf_dpi})...")
-        image_paths = pdf_to_images(pdf_path, temp_dir, dpi=pdf_dpi)
-        if not image_paths:
-            print(f"   ❌ PDF转换失败，无法继续分析")
-            return None
-        print(f"   ✅ PDF转换完成，共 {len(image_paths)} 页")
-        
-        if max_pages is not None and len(image_paths) > max_pages:
-            image_paths = image_paths[:max_pages]
-        
-        # 2. 并发OCR分析
-        ocr_results = []
-        all_key_figures = []
-
-        print(f"   🔍 开始OCR分析 (并发数={ocr_workers})...")
-        # 准备任务参数
-        tasks = [(i, img_path, ocr_dir, figures_dir, save_viz, save_cropped)
-                 for i, img_path in enumerate(image_paths)]
-
-        # 并发执行OCR
-        with ThreadPoolExecutor(max_workers=ocr_workers) as executor:
-            futures = {executor.submit(process_single_page, task): task for task in tasks}
-            for future in as_completed(futures):
-                result = future.result()
-                if result and isinstance(result, dict):
-                    ocr_results.append(result)
-                    all_key_figures.extend(result.get('figures', []))
-
-        # 按页码排序
-        ocr_results.sort(key=lambda x: x['page'])
-        print(f"   ✅ OCR完成: {len(ocr_results)}/{len(image_paths)} 页成功识别")
+    print(f"   📑 正在转换PDF为图片并OCR分析 (DPI={pdf_dpi}, 并发数={ocr_workers})...")
+    ocr_results, all_key_figures, rendered = _ocr_pdf_pages(
+        pdf_path, pdf_bytes, pdf_dpi, max_pages, ocr_dir, figures_dir, save_viz, save_cropped, ocr_workers
+    )
+    if not rendered:
+        print(f"   ❌ PDF转换失败，无法继续分析")
+        return None
+    print(f"   ✅ OCR完成: {len(ocr_results)}/{rendered} 页成功识别")
 
     # 3. LLM分析内容
     print(f"   🧠 正在LLM分析论文内容...")
@@ -736,32 +979,34 @@ def analyze_paper_deep(pdf_path: str, paper_info: Dict, category_dir: str) -> Di
         'ocr_model': ocr_config.get('model', 'deepseek-ocr'),
         'ocr_calls': token_usage['ocr_calls'],
         'ocr_tokens': token_usage['ocr_tokens'],
-        'llm_model': config['openai']['model'],
+        'llm_model': llm_token_info.get('model') or config['openai']['model'],
         'llm_calls': token_usage['llm_calls'],
         'llm_tokens_input': token_usage['llm_tokens_input'],
         'llm_tokens_output': token_usage['llm_tokens_output'],
+        'llm_tokens_cached': token_usage.get('llm_tokens_cached', 0),
+        'llm_cache_hits': token_usage.get('llm_cache_hits', 0),
         'total_time': time.time() - start_total
     }
     
-    generate_paper_note(paper_info, analysis, selected_figures, note_path, token_info_summary)
+    note_content = generate_paper_note(paper_info, analysis, selected_figures, note_path, token_info_summary)
     print(f"   ✅ 笔记已生成: {note_path}")
 
     # 6. 保存分析数据
     analysis_data_path = os.path.join(paper_dir, "analysis.json")
-    with open(analysis_data_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'paper_info': paper_info,
-            'analysis': analysis,
-            'selected_figures': selected_figures,
-            'all_figures_count': len(all_key_figures),
-            'token_usage': token_info_summary
-        }, f, ensure_ascii=False, indent=2)
+    utils.write_json(analysis_data_path, {
+        'paper_info': paper_info,
+        'analysis': analysis,
+        'selected_figures': selected_figures,
+        'all_figures_count': len(all_key_figures),
+        'token_usage': token_info_summary
+    }, indent=True)
 
     print(f"   📊 分析完成: 提取 {len(selected_figures)} 张图表, 耗时 {token_info_summary['total_time']:.1f}秒")
 
     return {
         'paper_dir': paper_dir,
         'note_path': note_path,
+        'note_content': note_content,
         'analysis': analysis,
         'selected_figures': selected_figures,
         'token_usage': token_info_summary
@@ -773,10 +1018,33 @@ def analyze_paper_deep(pdf_path: str, paper_info: Dict, category_dir: str) -> Di
 # 全局变量用于存储OCR中间结果
 _ocr_cache = {}
 
-def extract_ocr_only(pdf_path: str, paper_info: Dict, category_dir: str) -> Dict[str, Any]:
+
+def _load_ocr_cache(ocr_cache_path: str, pdf_path: str, pdf_dpi: int, max_pages: int):
+    """读取上次运行留下的 ocr_cache.json：PDF 未更新、渲染参数一致且裁剪图仍在磁盘上时返回缓存内容，否则返回 None"""
+    try:
+        if os.path.getmtime(ocr_cache_path) < os.path.getmtime(pdf_path):
+            return None
+        cached = utils.read_json(ocr_cache_path)
+    except (OSError, ValueError):
+        return None
+    if cached.get('pdf_dpi') != pdf_dpi or cached.get('max_pages') != max_pages:
+        return None
+    figures = cached.get('all_key_figures')
+    # 有页面识别失败的结果不复用，重跑时补齐
+    if not cached.get('complete') or not cached.get('ocr_results') or figures is None:
+        return None
+    if not all(os.path.exists(fig['crop_path']) for fig in figures):
+        return None
+    return cached
+
+
+def extract_ocr_only(pdf_path: str, paper_info: Dict, category_dir: str, pdf_bytes: bytes = None) -> Dict[str, Any]:
     """
     仅执行OCR阶段，保存OCR结果供后续LLM分析使用
 
+    Args:
+        pdf_bytes: 已在内存中的 PDF 内容（下载阶段返回），提供时不再从磁盘读取
+
     Returns:
         包含OCR结果的字典，失败返回None
     """
@@ -803,43 +1071,42 @@ def extract_ocr_only(pdf_path: str, paper_info: Dict, category_dir: str) -> Dict
     ocr_dir = os.path.join(paper_dir, "ocr")
     figures_dir = os.path.join(paper_dir, "figures")
 
-    os.makedirs(ocr_dir, exist_ok=True)
-    os.makedirs(figures_dir, exist_ok=True)
+    utils.ensure_dir(ocr_dir)
+    utils.ensure_dir(figures_dir)
 
-    print(f"   📄 OCR阶段: {paper_name}")
-
-    # 1. PDF转图片（临时目录）
-    import tempfile
-    with tempfile.TemporaryDirectory() as temp_dir:
-        print(f"      📑 PDF转图片 (DPI={pdf_dpi})...")
-        image_paths = pdf_to_images(pdf_path, temp_dir, dpi=pdf_dpi)
-        if not image_paths:
-            print(f"      ❌ PDF转换失败")
-            return None
-        print(f"      ✅ PDF转换完成: {len(image_paths)} 页")
-
-        if max_pages is not None and len(image_paths) > max_pages:
-            image_paths = image_paths[:max_pages]
-            print(f"      ℹ️  限制处理前 {max_pages} 页")
-
-        # 2. 并发OCR分析
-        ocr_results = []
-        all_key_figures = []
-
-        print(f"      🔍 OCR识别中 (并发={ocr_workers})...")
-        tasks = [(i, img_path, ocr_dir, figures_dir, save_viz, save_cropped)
-                 for i, img_path in enumerate(image_paths)]
+    # 同一 PDF 重跑时直接复用上次的 OCR 结果，不再渲染和调用 OCR
+    ocr_cache_path = os.path.join(paper_dir, "ocr_cache.json")
+    cached = _load_ocr_cache(ocr_cache_path, pdf_path, pdf_dpi, max_pages)
+    if cached is not None:
+        ocr_results = cached['ocr_results']
+        print(f"   ♻️  复用OCR缓存: {paper_name} ({len(ocr_results)} 页)")
+        ocr_data = {
+            'paper_name': paper_name,
+            'paper_dir': paper_dir,
+            'ocr_dir': ocr_dir,
+            'figures_dir': figures_dir,
+            'ocr_results': ocr_results,
+            'all_key_figures': cached['all_key_figures'],
+            'token_usage': {
+                'ocr_calls': 0,
+                'ocr_tokens': 0,
+                'ocr_cache_hits': len(ocr_results),
+            }
+        }
+        _ocr_cache[pdf_path] = ocr_data
+        return ocr_data
 
-        with ThreadPoolExecutor(max_workers=ocr_workers) as executor:
-            futures = {executor.submit(process_single_page, task): task for task in tasks}
-            for future in as_completed(futures):
-                result = future.result()
-                if result and isinstance(result, dict):
-                    ocr_results.append(result)
-                    all_key_figures.extend(result.get('figures', []))
+    print(f"   📄 OCR阶段: {paper_name}")
 
-        ocr_results.sort(key=lambda x: x['page'])
-        print(f"      ✅ OCR完成: {len(ocr_results)}/{len(image_paths)} 页成功")
+    # 1-2. PDF转图片（仅在内存中，超出 max_pages 的页面不渲染）+ 并发OCR分析
+    print(f"      📑 PDF转图片并OCR识别 (DPI={pdf_dpi}, 并发={ocr_workers})...")
+    ocr_results, all_key_figures, rendered = _ocr_pdf_pages(
+        pdf_path, pdf_bytes, pdf_dpi, max_pages, ocr_dir, figures_dir, save_viz, save_cropped, ocr_workers
+    )
+    if not rendered:
+        print(f"      ❌ PDF转换失败")
+        return None
+    print(f"      ✅ OCR完成: {len(ocr_results)}/{rendered} 页成功")
 
     # 保存OCR中间结果
     ocr_data = {
@@ -852,18 +1119,21 @@ def extract_ocr_only(pdf_path: str, paper_info: Dict, category_dir: str) -> Dict
         'token_usage': {
             'ocr_calls': token_usage['ocr_calls'],
             'ocr_tokens': token_usage['ocr_tokens'],
+            'ocr_cache_hits': token_usage.get('ocr_cache_hits', 0),
         }
     }
 
     # 保存到缓存和文件
     _ocr_cache[pdf_path] = ocr_data
-    ocr_cache_path = os.path.join(paper_dir, "ocr_cache.json")
-    with open(ocr_cache_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'ocr_results': ocr_results,
-            'all_key_figures_count': len(all_key_figures),
-            'token_usage': ocr_data['token_usage']
-        }, f, ensure_ascii=False, indent=2)
+    utils.write_json(ocr_cache_path, {
+        'pdf_dpi': pdf_dpi,
+        'max_pages': max_pages,
+        'complete': len(ocr_results) == rendered,
+        'ocr_results': ocr_results,
+        'all_key_figures': all_key_figures,
+        'all_key_figures_count': len(all_key_figures),
+        'token_usage': ocr_data['token_usage']
+    }, indent=True)
 
     return ocr_data
 
@@ -919,32 +1189,34 @@ def analyze_with_llm(ocr_data: Dict[str, Any], paper_info: Dict, category_dir: s
         'ocr_model': ocr_config.get('model', 'deepseek-ocr'),
         'ocr_calls': token_usage['ocr_calls'],
         'ocr_tokens': token_usage['ocr_tokens'],
-        'llm_model': config['openai']['model'],
+        'llm_model': llm_token_info.get('model') or config['openai']['model'],
         'llm_calls': token_usage['llm_calls'],
         'llm_tokens_input': token_usage['llm_tokens_input'],
         'llm_tokens_output': token_usage['llm_tokens_output'],
+        'llm_tokens_cached': token_usage.get('llm_tokens_cached', 0),
+        'llm_cache_hits': token_usage.get('llm_cache_hits', 0),
         'total_time': time.time() - start_total
     }
 
-    generate_paper_note(paper_info, analysis, selected_figures, note_path, token_info_summary)
+    note_content = generate_paper_note(paper_info, analysis, selected_figures, note_path, token_info_summary)
     print(f"      📝 笔记已生成")
 
     # 6. 保存分析数据
     analysis_data_path = os.path.join(paper_dir, "analysis.json")
-    with open(analysis_data_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'paper_info': paper_info,
-            'analysis': analysis,
-            'selected_figures': selected_figures,
-            'all_figures_count': len(all_key_figures),
-            'token_usage': token_info_summary
-        }, f, ensure_ascii=False, indent=2)
+    utils.write_json(analysis_data_path, {
+        'paper_info': paper_info,
+        'analysis': analysis,
+        'selected_figures': selected_figures,
+        'all_figures_count': len(all_key_figures),
+        'token_usage': token_info_summary
+    }, indent=True)
 
     print(f"      ✅ LLM阶段完成 (耗时 {token_info_summary['total_time']:.1f}秒)")
 
     return {
         'paper_dir': paper_dir,
         'note_path': note_path,
+        'note_content': note_content,
         'analysis': analysis,
         'selected_figures': selected_figures,
         'token_usage': token_info_summary
@@ -0,0 +1,93 @@
+"""
+PDF 渲染模块 - 将 PDF 页面栅格化为图片
+仅依赖 PyMuPDF，供 paper_analyzer 在独立进程中调用（CPU 密集，避免占用主进程 GIL）
+"""
+from typing import List, Tuple
+
+
+def _encode_pixmap(pix, image_format: str, jpeg_quality: int) -> bytes:
+    """把 pixmap 编码为图片字节；旧版 PyMuPDF 不支持 JPEG 输出时退回 PNG"""
+    if image_format in ('jpeg', 'jpg'):
+        try:
+            return pix.tobytes("jpeg", jpg_quality=jpeg_quality)
+        except (TypeError, ValueError):
+            pass
+    return pix.tobytes("png")
+
+
+def _open_pdf(fitz, pdf_path: str, pdf_bytes: bytes = None):
+    """打开 PDF；传入 pdf_bytes 时直接从内存打开，不再读盘"""
+    if pdf_bytes:
+        return fitz.open(stream=pdf_bytes, filetype="pdf")
+    return fitz.open(pdf_path)
+
+
+def count_pages(pdf_path: str, pdf_bytes: bytes = None) -> int:
+    """PDF 总页数（只解析文档结构，不渲染），打开失败返回 0"""
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        print("错误: 请先安装 PyMuPDF: pip install PyMuPDF")
+        return 0
+    try:
+        doc = _open_pdf(fitz, pdf_path, pdf_bytes)
+        try:
+            return len(doc)
+        finally:
+            doc.close()
+    except Exception as e:
+        print(f"   ❌ PDF打开失败: {str(e)[:100]}")
+        return 0
+
+
+def render_pdf_pages(pdf_path: str, dpi: int, pdf_bytes: bytes = None, start: int = 0, stop: int = None,
+                     image_format: str = 'jpeg', jpeg_quality: int = 85,
+                     colorspace: str = 'rgb') -> List[Tuple[int, bytes]]:
+    """
+    将PDF第 [start, stop) 页栅格化，返回 [(页码索引, 编码后的图片字节)]（不落盘，直接交给 OCR）
+    默认编码为 JPEG：文字页面体积比 PNG 小数倍，OCR 上传更快
+    colorspace='gray' 时按灰度渲染，像素缓冲只有 RGB 的 1/3，编码与上传的数据量也相应减少
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        print("错误: 请先安装 PyMuPDF: pip install PyMuPDF")
+        return []
+
+    # 尝试禁用MuPDF的警告输出（兼容不同版本）
+    try:
+        fitz.set_messages_enabled(False)
+    except AttributeError:
+        pass  # 某些PyMuPDF版本不支持此方法
+
+    doc = None
+    try:
+        doc = _open_pdf(fitz, pdf_path, pdf_bytes)
+        stop = len(doc) if stop is None else min(stop, len(doc))
+        images = []
+        failed_pages = []
+        mat = fitz.Matrix(dpi/72, dpi/72)
+        cs = fitz.csGRAY if colorspace == 'gray' else fitz.csRGB
+
+        for page_num in range(start, stop):
+            try:
+                pix = doc[page_num].get_pixmap(matrix=mat, colorspace=cs, alpha=False)
+                images.append((page_num, _encode_pixmap(pix, image_format, jpeg_quality)))
+            except Exception as e:
+                failed_pages.append(page_num + 1)
+                print(f"   ⚠️  Page {page_num + 1} 转换失败: {str(e)[:50]}")
+                continue
+
+        if failed_pages:
+            print(f"   ⚠️  PDF转换: {len(failed_pages)}/{stop - start} 页失败 (页码: {failed_pages[:5]}{'...' if len(failed_pages) > 5 else ''})")
+
+        return images
+    except Exception as e:
+        print(f"   ❌ PDF打开失败: {str(e)[:100]}")
+        return []
+    finally:
+        if doc:
+            try:
+                doc.close()
+            except:
+                pass
@@ -1,51 +1,198 @@
 import os
-import re
-import requests
+import json
+import atexit
+import functools
+import threading
+import httpx
 import arxiv
 import time
+import random
+import asyncio
+from src import cache
+from src.config import config
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时回退到标准库 json
+    orjson = None
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 为可选依赖，缺失时按字符粗略估算 token 数
+    tiktoken = None
+
+# arXiv 要求程序化批量访问使用 export 镜像
+ARXIV_PDF_BASE = "https://export.arxiv.org/pdf"
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+# 流式下载的分块大小（PDF 通常数 MB，较大的分块减少 Python 层循环次数）
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 本进程已创建（或确认存在）的目录
+_created_dirs = set()
+_created_dirs_lock = threading.Lock()
+
+# 进程内共享的同步 HTTP 客户端（OpenAI 客户端与同步下载共用连接池）
+_http_client = None
+_http_client_lock = threading.Lock()
+
+# 服务端 Retry-After 要求的等待时间上限（秒），PDF 下载与 LLM/OCR 重试共用
+RETRY_AFTER_MAX = config.get('concurrency', {}).get('retry_after_max', 120)
+
+def _retry_after_seconds(response, default):
+    """解析 Retry-After 响应头（秒数，不超过 RETRY_AFTER_MAX），缺失或无法解析时返回默认值"""
+    try:
+        return min(max(float(response.headers.get('Retry-After')), 0), RETRY_AFTER_MAX)
+    except (TypeError, ValueError):
+        return default
+
+# 重试无意义的客户端错误（参数错误、鉴权失败、模型不存在等）
+_NON_RETRYABLE_STATUS = frozenset((400, 401, 403, 404, 422))
+
+def backoff_delay(exc, attempt, base_delay, max_delay=60):
+    """
+    计算 API 调用失败后的重试等待秒数：指数退避 + 随机抖动（不超过 max_delay），不可重试的错误返回 None
+    429 时优先遵循 Retry-After（与 PDF 下载同一解析逻辑和上限）
+    """
+    status = getattr(exc, 'status_code', None)
+    if status in _NON_RETRYABLE_STATUS:
+        return None
+    response = getattr(exc, 'response', None)
+    if status == 429 and response is not None:
+        delay = _retry_after_seconds(response, None)
+        if delay is not None:
+            return delay
+    return min(max_delay, base_delay * (2 ** attempt) + random.uniform(0, base_delay or 1))
+
+def json_dumps(obj, indent=False) -> str:
+    """序列化为 JSON 字符串（非 ASCII 字符原样保留）"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=str, option=option).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, default=str, indent=2 if indent else None)
+
+def json_loads(data):
+    """解析 JSON 字符串或字节串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def read_json(path):
+    """读取 JSON 文件"""
+    with open(path, 'rb') as f:
+        return json_loads(f.read())
+
+def write_json(path, obj, indent=False):
+    """写入 JSON 文件（orjson 直接输出字节，省去一次编码）"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, default=str, option=option))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, ensure_ascii=False, default=str, indent=2 if indent else None)
+
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model):
+    """按模型名获取 tiktoken 分词器（首次加载较慢，按模型缓存）；不可用时返回 None"""
+    if tiktoken is None or not model:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:  # 兼容接口上的非 OpenAI 模型，用通用编码近似
+            return tiktoken.get_encoding('o200k_base')
+    except Exception:  # 离线且无 BPE 缓存等情况：回退到按字符估算
+        return None
+
+def _char_cost(ch):
+    """单个字符的估算 token 开销（单位：1/4 token）：中日韩等宽字符约 1 token，其余约 4 个字符 1 token"""
+    return 4 if ord(ch) >= 0x2e80 else 1
+
+def estimate_tokens(text, model=None) -> int:
+    """计算文本的 token 数：指定模型且 tiktoken 可用时精确计数，否则按字符粗略估算"""
+    enc = _get_encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return (sum(map(_char_cost, text)) + 3) // 4
+
+def truncate_tokens(text, max_tokens, model=None, suffix='...') -> str:
+    """按 token 数截断文本，被截断时追加 suffix"""
+    enc = _get_encoding(model)
+    if enc is not None:
+        tokens = enc.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return enc.decode(tokens[:max_tokens]) + suffix
+    budget = max_tokens * 4
+    for i, ch in enumerate(text):
+        budget -= _char_cost(ch)
+        if budget < 0:
+            return text[:i] + suffix
+    return text
+
+def ensure_dir(path):
+    """创建目录（带进程内缓存：同一目录只调用一次 makedirs，省去重复的 stat 系统调用）"""
+    if not path or path in _created_dirs:
+        return
+    os.makedirs(path, exist_ok=True)
+    with _created_dirs_lock:
+        _created_dirs.add(path)
+
+# 小于该大小的 PDF 视为下载不完整
+MIN_PDF_SIZE = 10240
+
+def _has_complete_pdf(path):
+    """本地 PDF 是否已完整下载（一次 stat 同时判断存在与大小）"""
+    try:
+        return os.stat(path).st_size > MIN_PDF_SIZE
+    except OSError:
+        return False
+
+# 文件名非法字符的删除表（str.translate 单次遍历删除，无需正则）
+_ILLEGAL_FILENAME_CHARS = str.maketrans('', '', '\\/*?:"<>|')
+
+@functools.lru_cache(maxsize=4096)
 def sanitize_filename(filename):
-    """清理文件名中的非法字符"""
-    return re.sub(r'[\\/*?:"<>|]', "", filename).strip().replace(' ', '_')
+    """清理文件名中的非法字符（纯函数，结果缓存；同一作者/标题多次出现时直接复用）"""
+    return filename.translate(_ILLEGAL_FILENAME_CHARS).strip().replace(' ', '_')
 
 def download_pdf(arxiv_id, save_path, max_retries=3, retry_delay=2):
     """通过 arxiv ID 下载 PDF，支持重试机制"""
     # 如果文件已存在且大小正常(>10KB)，跳过下载
-    if os.path.exists(save_path) and os.path.getsize(save_path) > 10240:
+    if _has_complete_pdf(save_path):
         return True
 
-    pdf_url = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+    pdf_url = f"{ARXIV_PDF_BASE}/{arxiv_id}.pdf"
+    client = get_http_client()
 
     for attempt in range(max_retries):
         try:
-            response = requests.get(pdf_url, headers=headers, stream=True, timeout=60)
-
-            if response.status_code == 200:
-                # 确保目录存在
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                with open(save_path, 'wb') as f:
-                    for chunk in response.iter_content(8192):  # 增大chunk size
-                        if chunk:
-                            f.write(chunk)
-                # 验证文件是否正确下载
-                if os.path.exists(save_path) and os.path.getsize(save_path) > 10240:
-                    if attempt > 0:
-                        print(f"   ✅ PDF下载成功 (第{attempt + 1}次尝试): {arxiv_id}")
-                    return True
+            with client.stream('GET', pdf_url, headers=DEFAULT_HEADERS, timeout=60) as response:
+                if response.status_code == 200:
+                    # 确保目录存在
+                    ensure_dir(os.path.dirname(save_path))
+                    with open(save_path, 'wb') as f:
+                        for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            if chunk:
+                                f.write(chunk)
+                    # 验证文件是否正确下载
+                    if _has_complete_pdf(save_path):
+                        if attempt > 0:
+                            print(f"   ✅ PDF下载成功 (第{attempt + 1}次尝试): {arxiv_id}")
+                        return True
+                    else:
+                        print(f"   ⚠️  PDF文件大小异常: {arxiv_id}")
+                        if attempt < max_retries - 1:
+                            time.sleep(retry_delay * (attempt + 1))
+                            continue
+                        return False
                 else:
-                    print(f"   ⚠️  PDF文件大小异常: {arxiv_id}")
+                    print(f"   ⚠️  PDF下载失败 (HTTP {response.status_code}): {arxiv_id} (尝试 {attempt + 1}/{max_retries})")
                     if attempt < max_retries - 1:
-                        time.sleep(retry_delay * (attempt + 1))
+                        time.sleep(_retry_after_seconds(response, retry_delay * (attempt + 1)))
                         continue
                     return False
-            else:
-                print(f"   ⚠️  PDF下载失败 (HTTP {response.status_code}): {arxiv_id} (尝试 {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-                return False
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             print(f"   ⚠️  PDF下载超时 ({arxiv_id}): 尝试 {attempt + 1}/{max_retries}")
             if attempt < max_retries - 1:
                 time.sleep(retry_delay * (attempt + 1))
@@ -60,38 +207,136 @@ def download_pdf(arxiv_id, save_path, max_retries=3, retry_delay=2):
 
     return False
 
-def get_arxiv_metadata_stream(arxiv_ids, chunk_size=10, delay=3):
+def _http2_available():
+    """HTTP/2 需要可选依赖 h2"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def get_http_client():
+    """获取进程内共享的同步 httpx.Client（keep-alive 复用 TLS 连接，线程安全）"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                http2=_http2_available(),
+                timeout=60,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=64)
+            )
+            atexit.register(_http_client.close)
+        return _http_client
+
+def create_async_http_client(max_connections=64, timeout=60):
+    """创建流水线共享的异步 HTTP 客户端（连接池复用，装有 h2 时启用 HTTP/2）"""
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        timeout=timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        headers=DEFAULT_HEADERS
+    )
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _write_bytes(path, data):
+    ensure_dir(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(data)
+
+async def download_pdf_async(client, arxiv_id, save_path, max_retries=3, retry_delay=2):
+    """
+    异步下载 PDF（复用共享 httpx.AsyncClient）
+
+    Returns:
+        PDF 文件内容 bytes，供后续深度分析直接使用而无需重新读盘；失败返回 None
+    """
+    # 如果文件已存在且大小正常(>10KB)，跳过下载
+    # 读写整份 PDF 放到线程中执行，不阻塞事件循环上的其他下载与调度
+    if _has_complete_pdf(save_path):
+        return await asyncio.to_thread(_read_bytes, save_path)
+
+    pdf_url = f"{ARXIV_PDF_BASE}/{arxiv_id}.pdf"
+
+    for attempt in range(max_retries):
+        try:
+            async with client.stream('GET', pdf_url) as response:
+                if response.status_code == 200:
+                    content = b"".join([chunk async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE)])
+                else:
+                    print(f"   ⚠️  PDF下载失败 (HTTP {response.status_code}): {arxiv_id} (尝试 {attempt + 1}/{max_retries})")
+                    if attempt < max_retries - 1:
+                        # 429/503 时按服务端给出的 Retry-After 等待
+                        await asyncio.sleep(_retry_after_seconds(response, retry_delay * (attempt + 1)))
+                        continue
+                    return None
+
+            # 验证文件是否正确下载，通过后一次性写盘
+            if len(content) > MIN_PDF_SIZE:
+                await asyncio.to_thread(_write_bytes, save_path, content)
+                if attempt > 0:
+                    print(f"   ✅ PDF下载成功 (第{attempt + 1}次尝试): {arxiv_id}")
+                return content
+            print(f"   ⚠️  PDF文件大小异常: {arxiv_id}")
+        except httpx.TimeoutException:
+            print(f"   ⚠️  PDF下载超时 ({arxiv_id}): 尝试 {attempt + 1}/{max_retries}")
+        except Exception as e:
+            print(f"   ⚠️  PDF下载异常 ({arxiv_id}): {str(e)[:50]} (尝试 {attempt + 1}/{max_retries})")
+
+        if attempt < max_retries - 1:
+            await asyncio.sleep(retry_delay * (attempt + 1))
+
+    return None
+
+@functools.lru_cache(maxsize=4)
+def _get_arxiv_client(page_size, delay):
+    """共享的 arXiv API 客户端：请求间隔由客户端按 delay_seconds 统一控制（跨批次生效）"""
+    return arxiv.Client(page_size=page_size, delay_seconds=delay, num_retries=3)
+
+def get_arxiv_metadata_stream(arxiv_ids, chunk_size=50, delay=3):
     """
     流式获取 arXiv 论文元数据，支持生成器模式
+    已缓存的元数据直接返回，只向 arXiv 请求未命中的 ID
     """
-    for i in range(0, len(arxiv_ids), chunk_size):
-        chunk = arxiv_ids[i:i + chunk_size]
+    meta_cache = cache.get_cache(config.get('cache', {}))
+    missing_ids = []
+    for aid in arxiv_ids:
+        cached = meta_cache.get('arxiv_meta', aid) if meta_cache else None
+        if cached is not None:
+            yield aid, cached
+        else:
+            missing_ids.append(aid)
+
+    client = _get_arxiv_client(chunk_size, delay)
+    for i in range(0, len(missing_ids), chunk_size):
+        chunk = missing_ids[i:i + chunk_size]
         
         max_retries = 5
         for attempt in range(max_retries):
             try:
-                # 第一批之前先等待，避免初始请求过快
-                if i == 0 and attempt == 0:
-                    time.sleep(2)  # 减少初始等待
-                elif i > 0 or attempt > 0:
-                    wait_time = delay + (attempt * 5)
-                    time.sleep(wait_time)
-                
-                search = arxiv.Search(id_list=chunk)
+                # 成功路径上不再额外 sleep：相邻请求的间隔已由 client 保证
+                search = arxiv.Search(id_list=chunk, max_results=len(chunk))
                 batch_results = []
-                for r in search.results():
+                for r in client.results(search):
                     clean_id = r.get_short_id().split('v')[0]
                     paper_data = {
                         'title': r.title,
                         'authors': [a.name for a in r.authors],
                         'summary': r.summary.replace('\n', ' '),
-                        'published': r.published,
+                        # 存为 ISO 字符串：缓存按 JSON 序列化，命中与未命中时类型一致
+                        'published': r.published.isoformat() if r.published else None,
                         'pdf_url': r.pdf_url,
                         'arxiv_id': clean_id
                     }
                     batch_results.append((clean_id, paper_data))
                 
                 for res in batch_results:
+                    if meta_cache:
+                        meta_cache.set('arxiv_meta', res[0], res[1])
                     yield res
                 break
                 
@@ -103,7 +348,7 @@ def get_arxiv_metadata_stream(arxiv_ids, chunk_size=10, delay=3):
                         break
                     time.sleep(5)
 
-def get_arxiv_metadata(arxiv_ids, chunk_size=10, delay=3):
+def get_arxiv_metadata(arxiv_ids, chunk_size=50, delay=3):
     """保持向后兼容的同步版本"""
     results = {}
     for aid, data in get_arxiv_metadata_stream(arxiv_ids, chunk_size, delay):
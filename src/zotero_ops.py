@@ -1,19 +1,27 @@
 from pyzotero import Zotero
-import yaml
 import os
+import copy
 import time
+import functools
+import threading
+from src import utils
+from src.config import config
 
-with open('config.yaml', 'r', encoding='utf-8') as f:
-    config = yaml.safe_load(f)
-
-zot = Zotero(
-    config['zotero']['library_id'],
-    config['zotero']['library_type'],
-    config['zotero']['api_key']
-)
+@functools.lru_cache(maxsize=1)
+def get_zotero_client():
+    """Zotero 客户端（首次使用时创建，导入本模块不触发客户端初始化）"""
+    return Zotero(
+        config['zotero']['library_id'],
+        config['zotero']['library_type'],
+        config['zotero']['api_key']
+    )
 
 # 缓存
 collection_cache = {} 
+# 新建分类加锁：多篇论文同时落到同一个新分类时只创建一次
+_collection_lock = threading.Lock()
+# 同时进行的上传数上限（每篇论文在流水线线程中各自上传，避免突发请求触发 Zotero 限流）
+_upload_sem = threading.BoundedSemaphore(max(1, config['zotero'].get('upload_workers', 4)))
 
 def get_existing_structure():
     """
@@ -26,15 +34,17 @@ def get_existing_structure():
     }
     
     try:
-        # 1. 获取所有 Collections
-        colls = zot.collections()
+        zot = get_zotero_client()
+        # 1. 获取所有 Collections（collections() 只返回第一页，everything 翻页取全，
+        #    否则 collection_cache 不完整，已有分类会被当作新分类重复创建）
+        colls = zot.everything(zot.collections())
         for c in colls:
             structure["collections"].append(c['data']['name'])
             collection_cache[c['data']['name']] = c['key']
             
         # 2. 获取标签
         # 【关键修改】：去掉了 sort='count'，因为 API 不支持。
-        # limit=50 默认是按字母顺序获取前 50 个标签。
+        # limit=50 默认是按字母顺序获取前 50 个标签。标签只作为筛选 Prompt 的参考，不取全量以控制 Prompt 长度
         tags = zot.tags(limit=50)
         structure["tags"] = [t for t in tags]
         
@@ -44,25 +54,109 @@ def get_existing_structure():
         print(f"⚠️ Zotero 扫描非致命错误 (不影响后续上传): {e}")
         return structure
 
+def _structure_cache_path():
+    return os.path.join(config.get('cache', {}).get('dir', '.cache'), 'zotero_structure.json')
+
+def _write_structure_cache(cache_path, data):
+    """先写临时文件再原子替换，并发运行或中途退出都不会留下半截 JSON"""
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        utils.write_json(tmp_path, data)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ Zotero 结构缓存写入失败: {e}")
+
+def get_existing_structure_cached(ttl_hours=None, refresh=False):
+    """
+    带本地缓存的 get_existing_structure：结构一天内很少变化，避免每次启动都扫描 Zotero
+    - 缓存文件未超过 TTL（按文件 mtime 判断）：直接使用
+    - 已过期：先查询库版本号 (Last-Modified-Version)，未变化则续期复用，否则重新扫描
+    - refresh=True（--refresh-zotero）：跳过缓存，强制重新扫描
+    """
+    cache_config = config.get('cache', {})
+    if ttl_hours is None:
+        ttl_hours = cache_config.get('zotero_ttl_hours', 6)
+    cache_path = _structure_cache_path()
+
+    cached, age = None, None
+    if not refresh:
+        try:
+            cached = utils.read_json(cache_path)
+            age = time.time() - os.path.getmtime(cache_path)
+        except (OSError, ValueError):
+            cached = None
+
+    if cached and age is not None:
+        fresh = age < ttl_hours * 3600
+        if not fresh:
+            try:
+                fresh = cached.get('version') is not None and get_zotero_client().last_modified_version() == cached['version']
+                if fresh:
+                    os.utime(cache_path)
+            except Exception:
+                fresh = False
+        if fresh:
+            collection_cache.update(cached.get('collection_keys', {}))
+            structure = cached['structure']
+            print(f"✅ 使用缓存的 Zotero 结构: {len(structure['collections'])} 个分类, {len(structure['tags'])} 个标签")
+            return structure
+
+    try:
+        version = get_zotero_client().last_modified_version()
+    except Exception:
+        version = None
+
+    structure = get_existing_structure()
+    if structure['collections'] or structure['tags']:
+        _write_structure_cache(cache_path, {
+            'version': version,
+            'structure': structure,
+            'collection_keys': dict(collection_cache)
+        })
+    return structure
+
+def _cache_new_collection(category_name, key):
+    """
+    把新建的分类写回本地结构缓存（调用方持有 _collection_lock）
+    否则 TTL 内再次运行（如崩溃后续跑）看不到本次新建的分类，会重复创建同名分类
+    """
+    cache_path = _structure_cache_path()
+    try:
+        cached = utils.read_json(cache_path)
+    except (OSError, ValueError):
+        return
+    collections = cached.setdefault('structure', {}).setdefault('collections', [])
+    if category_name not in collections:
+        collections.append(category_name)
+    cached.setdefault('collection_keys', {})[category_name] = key
+    _write_structure_cache(cache_path, cached)
+
 def get_or_create_collection_id(category_name):
     # 1. 检查缓存
     if category_name in collection_cache:
         return collection_cache[category_name]
     
+    with _collection_lock:
+        # 等锁期间其他线程可能已创建同名分类
+        if category_name in collection_cache:
+            return collection_cache[category_name]
+        return _create_collection(category_name)
+
+def _create_collection(category_name):
     # 2. 如果没缓存，说明是新分类，需要创建
     root_id = config['zotero'].get('collection_id')
     
     try:
-        # 防止并发创建同名文件夹，简单查重
-        # (注：严格来说这里应该加锁，但为了代码简单，依靠 Zotero 自身去重或接受重复)
         print(f"🔨 正在创建新分类: {category_name}")
-        resp = zot.create_collections([{
+        resp = get_zotero_client().create_collections([{
             'name': category_name,
             'parentCollection': root_id if root_id else None
         }])
         if resp['success']:
             new_key = resp['success']['0']
             collection_cache[category_name] = new_key
+            _cache_new_collection(category_name, new_key)
             return new_key
         else:
             return root_id 
@@ -70,17 +164,29 @@ def get_or_create_collection_id(category_name):
         print(f"❌ 创建分类异常: {e}")
         return root_id
 
+@functools.lru_cache(maxsize=None)
+def _fetch_item_template(itemtype, linkmode=None):
+    return get_zotero_client().item_template(itemtype, linkmode)
+
+def _item_template(itemtype, linkmode=None):
+    """条目模板在进程内只向 Zotero 请求一次，之后每次返回一份深拷贝"""
+    return copy.deepcopy(_fetch_item_template(itemtype, linkmode))
+
 def upload_paper_linked(meta, pdf_path, note_content, tags, category):
     retries = 3
     for i in range(retries):
         try:
-            return _upload_logic(meta, pdf_path, note_content, tags, category)
+            with _upload_sem:
+                return _upload_logic(meta, pdf_path, note_content, tags, category)
         except Exception as e:
-            # 捕获网络超时
-            if "handshake" in str(e).lower() or "timeout" in str(e).lower() or "connection" in str(e).lower():
-                time.sleep(2 * (i+1))
-                if i == retries - 1:
+            msg = str(e).lower()
+            # 捕获网络超时与限流（429），指数退避 + 随机抖动后重试，避免多篇论文同时重试
+            if any(k in msg for k in ("handshake", "timeout", "connection", "429", "too many requests")):
+                delay = utils.backoff_delay(e, i, 2)
+                if i == retries - 1 or delay is None:
                     print(f"❌ Zotero 上传超时: {meta['title'][:15]}")
+                    break
+                time.sleep(delay)
             # 捕获 400 错误（通常是参数问题，不重试）
             elif "400" in str(e):
                 print(f"❌ Zotero 参数错误 (Code 400): {e}")
@@ -92,7 +198,7 @@ def upload_paper_linked(meta, pdf_path, note_content, tags, category):
 
 def _upload_logic(meta, pdf_path, note_content, tags, category):
     # 1. 准备元数据
-    template = zot.item_template('preprint') 
+    template = _item_template('preprint') 
     template['title'] = meta['title']
     template['abstractNote'] = meta['summary']
     template['url'] = meta['pdf_url']
@@ -108,38 +214,46 @@ def _upload_logic(meta, pdf_path, note_content, tags, category):
             })
         template['creators'] = creators
         
-    final_tags = list(set(tags + [category]))
-    template['tags'] = [{'tag': t} for t in final_tags]
+    template['tags'] = [{'tag': t} for t in {*tags, category}]
     
     col_id = get_or_create_collection_id(category)
     if col_id:
         template['collections'] = [col_id]
 
     # 创建条目
-    resp = zot.create_items([template])
+    resp = get_zotero_client().create_items([template])
     if not resp['success']: return None
     parent_key = resp['success']['0']
     
-    # 2. 链接本地文件
+    # 2-3. 链接本地文件与笔记都是子条目，合并为一次 create_items 请求（少一次 API 往返）
+    children = []
     if os.path.exists(pdf_path):
         try:
             # 使用正确的 pyzotero API 创建链接附件
-            attachment_template = zot.item_template('attachment', 'linked_file')
+            attachment_template = _item_template('attachment', 'linked_file')
             attachment_template['title'] = os.path.basename(pdf_path)
             attachment_template['path'] = pdf_path
             attachment_template['parentItem'] = parent_key
-            zot.create_items([attachment_template])
+            children.append(('链接文件', attachment_template))
         except Exception as e:
             print(f"⚠️ 链接文件失败: {e}")
 
-    # 3. 上传笔记
     try:
-        note_template = zot.item_template('note')
+        note_template = _item_template('note')
         html_note = f"<h1>{meta['title']}</h1><hr>{note_content.replace(chr(10), '<br>')}"
         note_template['note'] = html_note
         note_template['parentItem'] = parent_key
-        zot.create_items([note_template])
+        children.append(('笔记上传', note_template))
     except Exception as e:
         print(f"⚠️ 笔记上传失败: {e}")
+
+    if children:
+        try:
+            resp = get_zotero_client().create_items([item for _, item in children])
+            # 部分失败时按请求中的下标定位是哪个子条目
+            for idx, err in (resp.get('failed') or {}).items():
+                print(f"⚠️ {children[int(idx)][0]}失败: {err.get('message', err)}")
+        except Exception as e:
+            print(f"⚠️ {'/'.join(name for name, _ in children)}失败: {e}")
     
     return parent_key